@@ -12,9 +12,16 @@ import datetime
 from customtkinter import *
 from tkinter import messagebox
 from Main_Script import main
+from client_cache import ClientTableCache
 
 CSV_FILE_PATH = "C:\\Users\\Administrator\\Better Bookkeeping Management\\BBKM - Documents\\BBKM Plan Management\\Client Names.csv"
 
+def read_client_table(path):
+    return pd.read_csv(path, header=None, names=['A', 'B'])
+
+# Parsed once and re-read only when the CSV changes, not on every keystroke
+client_table = ClientTableCache(CSV_FILE_PATH, read_client_table)
+
 class App:
     def __init__(self, root, stop_flag):
         self.root = root
@@ -149,7 +156,7 @@ class App:
 
         # Read the CSV file and populate the treeview
         if os.path.isfile(CSV_FILE_PATH):
-            data_frame = pd.read_csv(CSV_FILE_PATH, header=None, names=['A', 'B'])
+            data_frame = client_table.get().data
             unique_entries = data_frame.drop_duplicates().values.tolist()
             
             for entry in unique_entries:
@@ -165,7 +172,7 @@ class App:
 
         # Search the client names and codes
         if os.path.isfile(CSV_FILE_PATH):
-            data_frame = pd.read_csv(CSV_FILE_PATH, header=None, names=['A', 'B'])
+            data_frame = client_table.get().data
             for _, row in data_frame.iterrows():
                 name = row['A']
                 code = row['B']
@@ -275,10 +282,12 @@ class App:
             self.queue.put(None)  # Put a None value in the queue to signal the end of logs
 
 
-set_appearance_mode("dark")
-set_default_color_theme("dark-blue")
+# Guarded so OCR worker processes (which re-import this module on Windows) don't open a window
+if __name__ == "__main__":
+    set_appearance_mode("dark")
+    set_default_color_theme("dark-blue")
 
-root = CTk()
-stop_flag = threading.Event()  # Create an event flag for stopping the script
-app = App(root, stop_flag)
-root.mainloop()
\ No newline at end of file
+    root = CTk()
+    stop_flag = threading.Event()  # Create an event flag for stopping the script
+    app = App(root, stop_flag)
+    root.mainloop()
\ No newline at end of file
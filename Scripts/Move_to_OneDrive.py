@@ -1,18 +1,18 @@
+import atexit
 import os
 import shutil
 import re
 import time
 import hashlib
+import mmap
 import pandas as pd
-from pytesseract import pytesseract
-from pdf2image import convert_from_path
-from PIL import Image, ImageFilter, ImageOps
-import sqlite3
-from datetime import datetime, timedelta
+import ocr_engine
+import pdf_triage
+from history_store import HistoryStore
+from preprocessing import profile_summary
+from vendor_detector import VendorDetector, squash
 
 # -------------------- Config & Paths --------------------
-pytesseract.tesseract_cmd = r"C:\BBKM_InvoiceSorter\Library\Tesseract-OCR\tesseract.exe"
-
 NDIS_STATEMENT_PATH = r"C:\Users\Administrator\Better Bookkeeping Management\BBKM - Documents\BBKM Plan Management\NDIS\ZInvoices for lodgement\Invoice Program\NDIS Activity Statement"
 SRC_FOLDER = r"C:\BBKM_InvoiceSorter\Invoices\Renamed Invoices"
 DEST_FOLDER = r"C:\Users\Administrator\Better Bookkeeping Management\BBKM - Documents\BBKM Plan Management\NDIS\ZInvoices for lodgement\Invoice Program"
@@ -40,9 +40,23 @@ MISSING_FILES_LOG = r"C:\BBKM_InvoiceSorter\missing_files.log"
 COULD_NOT_MOVE_FOLDER = os.path.join(DEST_FOLDER_FAILED, "Could not move")
 os.makedirs(COULD_NOT_MOVE_FOLDER, exist_ok=True)
 
+# Vendor/category OCR resolutions: read at a low DPI first and re-OCR at the
+# next tier only when nothing (NDIS statement, STA/respite, vendor) was found
+VENDOR_DPI_TIERS = (150, 300)
+
+# Page text the rename stage already OCR'd (its "contrast" reads, at the same
+# dpi) is used as it is; only pages it never read are OCR'd again with "invert"
+VENDOR_REUSE_PROFILES = ("contrast",)
+
 # SQLite DB for 90-day duplicate detection
 DB_PATH = r"C:\BBKM_InvoiceSorter\file_history.sqlite"
 
+# Files at least this big are hashed through mmap in one call instead of a read loop
+MMAP_HASH_MIN_BYTES = 8 * 1024 * 1024
+
+# Hash cache hits/misses and the bytes hits saved reading, since start-up
+HASH_STATS = {"hits": 0, "misses": 0, "bytes_saved": 0}
+
 # -------------------- Load Vendors --------------------
 def load_vendors():
     df = pd.read_csv(VENDOR_CSV_PATH)
@@ -50,6 +64,9 @@ def load_vendors():
 
 VENDORS = load_vendors()
 
+# All vendor names in one automaton, used for page text and the filename fallback
+vendor_detector = VendorDetector(VENDORS)
+
 # -------------------- State Tracking --------------------
 missing_files = set()
 if os.path.exists(MISSING_FILES_LOG):
@@ -57,13 +74,6 @@ if os.path.exists(MISSING_FILES_LOG):
         missing_files.update(line.strip() for line in f if line.strip())
 
 # -------------------- Helpers --------------------
-def preprocess_image(image):
-    image = image.convert('L')
-    image = ImageOps.invert(image)
-    image = image.filter(ImageFilter.MedianFilter())
-    image = ImageOps.autocontrast(image)
-    return image
-
 def _file_size(path: str) -> int:
     try:
         return os.path.getsize(path)
@@ -73,10 +83,40 @@ def _file_size(path: str) -> int:
 def _file_hash(path: str, block_size: int = 1024 * 1024) -> str:
     h = hashlib.sha256()
     with open(path, "rb") as f:
-        for block in iter(lambda: f.read(block_size), b""):
-            h.update(block)
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_HASH_MIN_BYTES:
+            # One update over the mapped file: no Python-level read loop or buffer copies
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                h.update(m)
+        else:
+            for block in iter(lambda: f.read(block_size), b""):
+                h.update(block)
     return h.hexdigest()
 
+def _cached_file_hash(path: str) -> str:
+    """
+    SHA-256 of a file, reused from the hash_cache table while the file's
+    size, mtime and file id are unchanged (files stuck in a source folder
+    are otherwise re-read every loop).
+    """
+    st = os.stat(path)
+    key = (st.st_size, st.st_mtime_ns, str(st.st_ino))
+    cached = _db_cached_hash(path, key)
+    if cached:
+        HASH_STATS["hits"] += 1
+        HASH_STATS["bytes_saved"] += st.st_size
+        return cached
+    HASH_STATS["misses"] += 1
+    file_hash = _file_hash(path)
+    _db_store_hash(path, key, file_hash)
+    return file_hash
+
+def _hash_summary() -> str:
+    lookups = HASH_STATS["hits"] + HASH_STATS["misses"]
+    rate = f"{HASH_STATS['hits'] / lookups:.0%}" if lookups else "n/a"
+    return (f"Hash cache: {HASH_STATS['hits']}/{lookups} hits ({rate}), "
+            f"{HASH_STATS['bytes_saved'] / 2**20:.1f} MiB not re-read")
+
 def _unique_with_counter(dest: str) -> str:
     base, ext = os.path.splitext(dest)
     i = 1
@@ -86,93 +126,124 @@ def _unique_with_counter(dest: str) -> str:
         i += 1
     return cand
 
-def _wait_for_settle(path: str, checks: int = 3, delay: float = 0.8) -> bool:
+class SettleTracker:
     """
-    Wait until a file's size stays unchanged for `checks` intervals.
-    Helps avoid processing while OneDrive is syncing or a write is in progress.
+    Decides which files are safe to touch (not mid-sync or mid-write), for a
+    whole folder at once.
+
+    Sizes and mtimes are remembered across sweeps: a file unchanged since the
+    previous sweep is settled straight away. New or changed files share one
+    wait of `wait` seconds per call and are settled if they didn't change
+    during it; anything still changing is left for the next sweep.
     """
-    try:
-        last = -1
-        stable = 0
-        for _ in range(checks * 3):  # give a little extra runway
-            size = os.path.getsize(path)
-            if size == last:
-                stable += 1
-                if stable >= checks:
-                    return True
-            else:
-                stable = 0
-            last = size
-            time.sleep(delay)
-    except Exception:
-        return False
-    return True
 
-# NEW: find another file with the SAME NAME and SAME HASH in the same folder
-def _find_same_name_and_hash_in_folder(folder: str, my_path: str, my_name: str, my_hash: str):
+    def __init__(self, wait: float = 2.4):
+        self.wait = wait
+        self._seen = {}
+
+    @staticmethod
+    def _signature(path: str):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_size, st.st_mtime_ns
+
+    def settled(self, paths) -> set:
+        paths = list(paths)
+        current = {path: self._signature(path) for path in paths}
+        ready = {path for path, sig in current.items() if sig is not None and self._seen.get(path) == sig}
+        pending = [path for path, sig in current.items() if sig is not None and path not in ready]
+
+        if pending:
+            time.sleep(self.wait)
+            for path in pending:
+                sig = self._signature(path)
+                if sig is not None and sig == current[path]:
+                    ready.add(path)
+                current[path] = sig
+
+        # Forget files that have left the folder so the map doesn't grow
+        folders = {os.path.dirname(path) for path in paths}
+        self._seen = {path: sig for path, sig in self._seen.items() if os.path.dirname(path) not in folders}
+        self._seen.update((path, sig) for path, sig in current.items() if sig is not None)
+        return ready
+
+settle_tracker = SettleTracker()
+
+class FolderIndex:
     """
-    Returns the path of a sibling file that has the same name (case-insensitive)
-    and identical content hash. Returns None if not found.
+    Name (case-folded), size and SHA-256 of every file in a source folder,
+    built once per sweep. Each file is hashed at most once, and only when
+    something asks for its hash; duplicate checks are answered from the index
+    instead of re-listing and re-hashing the folder for every file.
     """
-    my_name_lower = my_name.lower()
-    for name in os.listdir(folder):
-        p = os.path.join(folder, name)
-        if p == my_path or not os.path.isfile(p):
-            continue
-        if name.lower() != my_name_lower:
-            continue  # must be same name
-        try:
-            if _file_hash(p) == my_hash:
-                return p
-        except Exception:
-            pass
-    return None
+
+    def __init__(self, folder: str, filenames):
+        self.folder = folder
+        self._by_name = {}
+        self._sizes = {}
+        self._hashes = {}
+        for name in filenames:
+            self._add(os.path.join(folder, name))
+
+    def _add(self, path: str):
+        self._by_name.setdefault(os.path.basename(path).casefold(), []).append(path)
+        self._sizes[path] = _file_size(path)
+
+    def hash(self, path: str) -> str:
+        if path not in self._hashes:
+            self._hashes[path] = _cached_file_hash(path)
+        return self._hashes[path]
+
+    def find_same_name_and_hash(self, path: str, file_hash: str):
+        """
+        Path of another file in the folder with the same name (case-insensitive)
+        and identical content hash, or None.
+        """
+        size = self._sizes.get(path, -1)
+        for other in self._by_name.get(os.path.basename(path).casefold(), []):
+            if other == path:
+                continue
+            other_size = self._sizes.get(other, -1)
+            if size >= 0 and other_size >= 0 and size != other_size:
+                continue  # same hash implies same size
+            try:
+                if self.hash(other) == file_hash:
+                    return other
+            except Exception:
+                self._hashes[other] = None  # unreadable; don't retry this sweep
+        return None
+
+    def renamed(self, old_path: str, new_path: str):
+        names = self._by_name.get(os.path.basename(old_path).casefold(), [])
+        if old_path in names:
+            names.remove(old_path)
+        self._sizes.pop(old_path, None)
+        file_hash = self._hashes.pop(old_path, None)
+        self._add(new_path)
+        if file_hash is not None:
+            self._hashes[new_path] = file_hash
 
 # -------------------- SQLite (SQL-only duplicate policy) --------------------
-def _db_init():
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS file_history (
-            sha256 TEXT PRIMARY KEY,
-            size INTEGER,
-            first_seen_utc INTEGER,
-            last_seen_utc INTEGER,
-            last_path TEXT
-        )
-    """)
-    con.commit()
-    con.close()
+history = HistoryStore(DB_PATH)
+atexit.register(history.close)
 
 def _db_seen_recently(file_hash: str, days: int = 90) -> bool:
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    cutoff = int((datetime.utcnow() - timedelta(days=days)).timestamp())
-    cur.execute("SELECT 1 FROM file_history WHERE sha256=? AND last_seen_utc>?", (file_hash, cutoff))
-    row = cur.fetchone()
-    con.close()
-    return row is not None
+    return history.seen_recently(file_hash, days)
 
 def _db_record(path: str, file_hash: str):
     try:
         size = os.path.getsize(path)
     except Exception:
         size = None
-    now = int(datetime.utcnow().timestamp())
-    con = sqlite3.connect(DB_PATH)
-    cur = con.cursor()
-    cur.execute("""
-        INSERT INTO file_history (sha256, size, first_seen_utc, last_seen_utc, last_path)
-        VALUES (?, ?, ?, ?, ?)
-        ON CONFLICT(sha256) DO UPDATE SET
-            last_seen_utc=excluded.last_seen_utc,
-            last_path=excluded.last_path,
-            size=COALESCE(excluded.size, size)
-    """, (file_hash, size, now, now, path))
-    con.commit()
-    con.close()
-
-_db_init()
+    history.record(path, file_hash, size)
+
+def _db_cached_hash(path: str, key):
+    return history.cached_hash(path, key)
+
+def _db_store_hash(path: str, key, file_hash: str):
+    history.store_hash(path, key, file_hash)
 
 # -------------------- Safe Move (with quarantine fallback) --------------------
 def safe_move(src, dest, log_message, retries: int = 3, wait_secs: float = 2.0):
@@ -221,8 +292,74 @@ def safe_move(src, dest, log_message, retries: int = 3, wait_secs: float = 2.0):
         print(f"Error in safe_move({src}): {e}")
         return False
 
+# -------------------- OCR Scan --------------------
+def _new_scan() -> dict:
+    return {"ndis_statement": False, "sta": False, "respite": False, "vendor": None}
+
+def _scan_content(content: str, scan: dict):
+    """Update `scan` from one page of OCR text."""
+    content = squash(content)
+    if "ndisactivitystatement" in content:
+        scan["ndis_statement"] = True
+        return
+    if re.search(r'\bsta\b|\b\dsta\b', content):
+        scan["sta"] = True
+    if re.search(r'inc\.\srespite', content):
+        scan["respite"] = True
+    vendor = vendor_detector.best(content)
+    if vendor is not None:
+        scan["vendor"] = vendor
+
+def _scan_pdf_pages(file_path: str, dpi: int, file_hash: str = None):
+    """
+    OCR the vendor-stage pages (first two and last by default, see
+    ocr_engine.STAGE_PAGE_BUDGETS; in parallel on the shared pool, results in
+    page order) and look for an NDIS activity statement, STA/respite markers
+    and a known vendor. Returns the scan and the mean OCR confidence of the
+    pages read.
+    """
+    scan = _new_scan()
+    confidences = []
+    pages = ocr_engine.stage_pages(file_path, "vendor")
+    for page in ocr_engine.ocr_pdf_pages(file_path, dpi, "invert", pages, file_hash,
+                                         reuse_profiles=VENDOR_REUSE_PROFILES):
+        if page.confidence is not None:
+            confidences.append(page.confidence)
+        _scan_content(page.text, scan)
+        if scan["ndis_statement"]:
+            break
+    return scan, (sum(confidences) / len(confidences) if confidences else None)
+
+def _scan_pdf(file_path: str, file_hash: str = None) -> dict:
+    """
+    Scan the vendor-stage pages at each of VENDOR_DPI_TIERS until something is
+    found. There is no header-region pass here: STA and respite markers (which
+    outrank the vendor when routing) can sit anywhere on the page, so a vendor
+    in the header couldn't settle the document anyway. A read that was
+    already confident isn't repeated at the next tier. `file_hash` keys the
+    shared OCR cache.
+    """
+    if file_hash is None:
+        file_hash = ocr_engine.document_hash(file_path)
+
+    def attempt(dpi):
+        scan, confidence = _scan_pdf_pages(file_path, dpi, file_hash)
+        return (scan, confidence), any(scan.values())
+
+    (scan, confidence), dpi = ocr_engine.run_tiers("vendor", VENDOR_DPI_TIERS, attempt, lambda result: result[1])
+    resolved = f"resolved at {dpi} dpi" if dpi else "nothing found"
+    if confidence is not None:
+        resolved += f" (confidence {confidence:.0f})"
+    print(f"Vendor OCR {resolved}: {file_path}")
+    return scan
+
 # -------------------- Core Logic --------------------
 def move_files(src_folder, dest_folder):
+    # All history writes of the sweep go out in one transaction
+    with history.batch():
+        _move_files(src_folder, dest_folder)
+
+def _move_files(src_folder, dest_folder):
     try:
         files = [f for f in os.listdir(src_folder)
                  if os.path.isfile(os.path.join(src_folder, f))
@@ -231,6 +368,13 @@ def move_files(src_folder, dest_folder):
         print(f"Source folder not found: {src_folder}")
         return
 
+    # Settle check for the whole folder at once (avoid mid-sync/mid-write)
+    settled = settle_tracker.settled(os.path.join(src_folder, f) for f in files)
+
+    # Names, sizes and (lazily) hashes of this folder for the duplicate checks below
+    index = FolderIndex(src_folder, files)
+
+    scanned_pdfs = False
     for filename in files:
         file_path = os.path.join(src_folder, filename)
 
@@ -238,14 +382,13 @@ def move_files(src_folder, dest_folder):
         if not os.path.exists(file_path):
             continue
 
-        # Wait for file to settle (avoid mid-sync/mid-write)
-        if not _wait_for_settle(file_path, checks=3, delay=0.8):
+        if file_path not in settled:
             print(f"Skipping (not settled yet): {file_path}")
             continue
 
         # Compute content hash early for SQL duplicate policy
         try:
-            file_hash = _file_hash(file_path)
+            file_hash = index.hash(file_path)
         except Exception as e:
             print(f"Error hashing {file_path}: {e}")
             file_hash = None
@@ -255,7 +398,7 @@ def move_files(src_folder, dest_folder):
         # 1) SQL says we've seen this hash within 90 days
         # 2) Another file in this source folder has the SAME NAME and SAME HASH
         if file_hash and _db_seen_recently(file_hash, 90):
-            match_path = _find_same_name_and_hash_in_folder(src_folder, file_path, filename, file_hash)
+            match_path = index.find_same_name_and_hash(file_path, file_hash)
             if match_path:
                 new_filename = f"double_{filename}"
                 new_path = os.path.join(src_folder, new_filename)
@@ -263,6 +406,7 @@ def move_files(src_folder, dest_folder):
                     new_path = _unique_with_counter(new_path)
                 try:
                     os.rename(file_path, new_path)
+                    index.renamed(file_path, new_path)
                     print(
                         f"Duplicate present (same name & same content in source): "
                         f"matched='{match_path}' → renamed '{filename}' → '{os.path.basename(new_path)}'"
@@ -291,35 +435,34 @@ def move_files(src_folder, dest_folder):
 
             # Process PDFs from SRC/FAILED
             if filename.lower().endswith(".pdf") and src_folder in [SRC_FOLDER, SRC_FOLDER_FAILED]:
-                # Verify readable PDF (render) else mark corrupt
+                # Structure-only triage first: nothing is rendered for a PDF
+                # that can't be read or has nothing on it
+                scanned_pdfs = True
+                kind = pdf_triage.triage_pdf(file_path)
+                if kind in (pdf_triage.ENCRYPTED, pdf_triage.EMPTY):
+                    dest_path = os.path.join(DEST_FOLDER_FAILED, filename)
+                    if safe_move(file_path, dest_path, f"Moved {kind} PDF to Failed to Code: {file_path}"):
+                        if file_hash:
+                            _db_record(dest_path, file_hash)
+                    continue
+
+                # OCR to detect vendor and categories; a PDF that can't be
+                # opened or rendered is marked corrupt
                 try:
-                    images = convert_from_path(file_path)
-                except Exception:
+                    if kind == pdf_triage.CORRUPT:
+                        raise ocr_engine.PdfRenderError(f"{file_path}: unreadable PDF structure")
+                    scan = _scan_pdf(file_path, file_hash)
+                except ocr_engine.PdfRenderError:
                     corrupt_filename = f"corrupt_{filename}"
                     corrupt_dest = os.path.join(DEST_FOLDER_FAILED, corrupt_filename)
                     if safe_move(file_path, corrupt_dest, f"Corrupt file moved: {file_path}"):
                         if file_hash:
                             _db_record(corrupt_dest, file_hash)
                     continue
-
-                found_sta = found_respite = found_ndis_statement = False
-                found_vendor = None
-
-                # OCR to detect vendor and categories
-                for image in images:
-                    content = pytesseract.image_to_string(preprocess_image(image)).lower().replace(" ", "")
-                    if "ndisactivitystatement" in content:
-                        found_ndis_statement = True
-                        break
-                    if re.search(r'\bsta\b|\b\dsta\b', content):
-                        found_sta = True
-                    if re.search(r'inc\.\srespite', content):
-                        found_respite = True
-                    for vendor_raw, folder_type in VENDORS.items():
-                        cleaned_vendor = vendor_raw.replace(" ", "").lower()
-                        if cleaned_vendor in content:
-                            found_vendor = vendor_raw
-                            break
+                found_ndis_statement = scan["ndis_statement"]
+                found_sta = scan["sta"]
+                found_respite = scan["respite"]
+                found_vendor = scan["vendor"]
 
                 # NDIS activity statements
                 if found_ndis_statement:
@@ -355,11 +498,7 @@ def move_files(src_folder, dest_folder):
                 if not found_vendor:
                     stem, _ext = os.path.splitext(filename)
                     norm_name = re.sub(r'[\s\u00A0._-]+', ' ', stem).strip().lower()
-                    squashed = norm_name.replace(" ", "")
-                    for vendor in VENDORS:
-                        if vendor.replace(" ", "").lower() in squashed:
-                            found_vendor = vendor
-                            break
+                    found_vendor = vendor_detector.best(squash(norm_name))
 
                 # Choose destination
                 if found_sta or found_respite:
@@ -391,6 +530,13 @@ def move_files(src_folder, dest_folder):
         except Exception as e:
             print(f"Error processing {filename}: {e}")
 
+    if scanned_pdfs:
+        print(_hash_summary())
+        print(pdf_triage.triage_summary())
+        print(ocr_engine.tier_summary("vendor"))
+        print(ocr_engine.cache_summary())
+        print(profile_summary())
+
 # -------------------- Entrypoint --------------------
 if __name__ == "__main__":
     move_files(SRC_FOLDER_ATTEMPT, DEST_FOLDER_ATTEMPT)
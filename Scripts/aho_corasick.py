@@ -0,0 +1,70 @@
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Multi-pattern string matcher. Patterns are compiled once into a trie with
+    failure links, then every occurrence of every pattern is found in a single
+    left-to-right pass over the text.
+
+    Each pattern carries a payload; `iter_matches` yields (start, end, payload)
+    for each occurrence, in order of the end position.
+    """
+
+    def __init__(self, patterns=()):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+        self._built = False
+        for pattern, payload in patterns:
+            self.add(pattern, payload)
+
+    def add(self, pattern: str, payload=None):
+        if not pattern:
+            return
+        if self._built:
+            raise RuntimeError("Cannot add patterns after the automaton has been built")
+        node = 0
+        for ch in pattern:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(pattern), payload))
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                # Inherit the outputs of the longest proper suffix
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+        self._built = True
+        return self
+
+    def __len__(self):
+        return sum(len(out) for out in self._out)
+
+    def iter_matches(self, text: str):
+        if not self._built:
+            self.build()
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            if out[node]:
+                end = i + 1
+                for length, payload in out[node]:
+                    yield end - length, end, payload
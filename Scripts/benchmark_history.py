@@ -0,0 +1,117 @@
+"""
+Per-file duplicate-history overhead in move_files: one 90-day lookup and one
+record per file against a file_history table of --rows rows.
+
+Compares
+  - legacy:  a new sqlite3 connection, statement and commit per call, no
+             index on last_seen_utc (the old _db_seen_recently/_db_record)
+  - store:   HistoryStore, one WAL connection, the sweep's writes in one
+             transaction, indexed window query
+
+Usage:
+    python benchmark_history.py [--rows 100000] [--files 1000]
+"""
+import argparse
+import hashlib
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from history_store import HistoryStore
+
+
+def make_history(db_path, rows, rng):
+    con = sqlite3.connect(db_path)
+    con.execute("""
+        CREATE TABLE file_history (
+            sha256 TEXT PRIMARY KEY,
+            size INTEGER,
+            first_seen_utc INTEGER,
+            last_seen_utc INTEGER,
+            last_path TEXT
+        )
+    """)
+    now = int(datetime.utcnow().timestamp())
+    con.executemany(
+        "INSERT INTO file_history VALUES (?, ?, ?, ?, ?)",
+        ((hashlib.sha256(str(i).encode()).hexdigest(), rng.randint(10_000, 5_000_000),
+          now - rng.randint(0, 400 * 86400), now - rng.randint(0, 400 * 86400), f"C:\\Invoices\\inv_{i}.pdf")
+         for i in range(rows)))
+    con.commit()
+    con.close()
+
+
+def legacy_seen_recently(db_path, file_hash, days=90):
+    con = sqlite3.connect(db_path)
+    cur = con.cursor()
+    cutoff = int((datetime.utcnow() - timedelta(days=days)).timestamp())
+    cur.execute("SELECT 1 FROM file_history WHERE sha256=? AND last_seen_utc>?", (file_hash, cutoff))
+    row = cur.fetchone()
+    con.close()
+    return row is not None
+
+
+def legacy_record(db_path, path, file_hash, size):
+    now = int(datetime.utcnow().timestamp())
+    con = sqlite3.connect(db_path)
+    cur = con.cursor()
+    cur.execute("""
+        INSERT INTO file_history (sha256, size, first_seen_utc, last_seen_utc, last_path)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(sha256) DO UPDATE SET
+            last_seen_utc=excluded.last_seen_utc,
+            last_path=excluded.last_path,
+            size=COALESCE(excluded.size, size)
+    """, (file_hash, size, now, now, path))
+    con.commit()
+    con.close()
+
+
+def sweep_files(count, rows, rng):
+    # Half re-sent files already in the history, half new ones
+    return [(f"C:\\Invoices\\new_{i}.pdf",
+             hashlib.sha256(str(rng.randrange(rows) if i % 2 else rows + i).encode()).hexdigest(),
+             rng.randint(10_000, 5_000_000)) for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    files = sweep_files(args.files, args.rows, rng)
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for mode in ("legacy", "store"):
+            db_path = os.path.join(tmp, f"{mode}.sqlite")
+            make_history(db_path, args.rows, random.Random(args.seed))
+
+            start = time.perf_counter()
+            if mode == "legacy":
+                seen = [legacy_seen_recently(db_path, h) for _, h, _ in files]
+                for path, h, size in files:
+                    legacy_record(db_path, path, h, size)
+            else:
+                store = HistoryStore(db_path)
+                store.seen_recently(files[0][1])  # open the connection and build the index outside the timing
+                start = time.perf_counter()
+                with store.batch():
+                    seen = [store.seen_recently(h) for _, h, _ in files]
+                    for path, h, size in files:
+                        store.record(path, h, size)
+                store.close()
+            elapsed = time.perf_counter() - start
+            results[mode] = seen
+            print(f"{mode:<8} {elapsed:>8.3f} s  {elapsed / len(files) * 1000:>7.3f} ms/file")
+        assert results["legacy"] == results["store"], "legacy and store disagree on the 90-day window"
+        print(f"{args.files} files against {args.rows} history rows, {sum(results['store'])} seen within 90 days")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Client-matching throughput: N filenames against M synthetic clients.
+
+Compares
+  - legacy:   legacy_matching.find_name_code_match, find_name_match for every
+              client row, timed on a sample of files and extrapolated
+  - matcher:  ClientMatcher.find_code once per filename
+
+and checks that both give the same code for every file in the sample.
+
+Usage:
+    python benchmark_matching.py [--files 1000] [--clients 5000] [--legacy-sample 5]
+"""
+import argparse
+import random
+import time
+
+from client_matcher import ClientMatcher
+from legacy_matching import find_name_code_match
+from tokenized_text import TokenizedText
+
+FIRST_NAMES = ["john", "mary", "james", "linda", "robert", "patricia", "michael", "jennifer", "david",
+               "elizabeth", "william", "susan", "thomas", "sarah", "daniel", "karen", "matthew", "nancy",
+               "anthony", "lisa", "mark", "betty", "paul", "helen", "steven", "sandra", "andrew", "donna"]
+LAST_NAMES = ["smith", "jones", "williams", "brown", "wilson", "taylor", "nguyen", "johnson", "martin",
+              "white", "anderson", "walker", "thompson", "thomas", "lee", "harris", "ryan", "robinson",
+              "kelly", "king", "davis", "wright", "evans", "roberts", "green", "hall", "wood", "jackson"]
+FILLER = ["invoice", "tax", "statement", "inv", "receipt", "support", "services", "NDIS", "plan", "march"]
+
+
+def make_clients(count, rng):
+    clients = []
+    for i in range(count):
+        first = rng.choice(FIRST_NAMES)
+        last = rng.choice(LAST_NAMES) + (str(i) if i >= len(FIRST_NAMES) * len(LAST_NAMES) else "")
+        clients.append((f"{first.title()} {last.title()}", f"C{i:05d}"))
+    return clients
+
+
+def make_filenames(count, clients, rng, hit_rate=0.6):
+    filenames = []
+    for i in range(count):
+        parts = [rng.choice(FILLER), str(rng.randint(1000, 99999))]
+        if rng.random() < hit_rate:
+            name = rng.choice(clients)[0].split()
+            if rng.random() < 0.3:
+                name = name[::-1]
+            name = "_".join(name) if rng.random() < 0.3 else " ".join(name)
+            if rng.random() < 0.1:
+                # "Smith John_ 123.pdf": spaCy splits the underscore off the last name
+                name += "_"
+            parts.insert(rng.randint(0, len(parts)), name)
+        filenames.append(" ".join(parts) + ".pdf")
+    return filenames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=5000)
+    parser.add_argument("--legacy-sample", type=int, default=5,
+                        help="files to time with the legacy loop (0 to skip)")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    clients = make_clients(args.clients, rng)
+    filenames = make_filenames(args.files, clients, rng)
+
+    start = time.perf_counter()
+    matcher = ClientMatcher(clients)
+    build = time.perf_counter() - start
+    print(f"{args.files} files x {args.clients} clients")
+    print(f"{'build index':<12} {build:>10.3f} s")
+
+    start = time.perf_counter()
+    results = [matcher.find_code(TokenizedText(name)) for name in filenames]
+    print(f"{'matcher':<12} {time.perf_counter() - start:>10.3f} s")
+    print(f"{'matched':<12} {sum(found for found, _ in results):>10d} files")
+
+    if args.legacy_sample:
+        sample = filenames[:args.legacy_sample]
+        start = time.perf_counter()
+        legacy = [find_name_code_match(name, clients) for name in sample]
+        elapsed = time.perf_counter() - start
+        print(f"{'legacy':<12} {elapsed / len(sample) * args.files:>10.3f} s (extrapolated from {len(sample)} files)")
+        mismatched = [name for name, old, new in zip(sample, legacy, results) if old != new]
+        assert not mismatched, f"legacy and matcher results differ for {mismatched}"
+
+
+if __name__ == "__main__":
+    main()
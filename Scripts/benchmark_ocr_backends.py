@@ -0,0 +1,56 @@
+"""
+Per-page OCR latency: one tesseract process per page (pytesseract) against
+one tesseract process per batch of pages (list-file input). Both read word
+data or plain text according to BBKM_OCR_WORD_DATA.
+
+Pages are rendered and preprocessed once up front so only Tesseract is timed.
+
+Usage:
+    python benchmark_ocr_backends.py invoice1.pdf [invoice2.pdf ...] [--dpi 150] [--batch 4] [--profile contrast]
+"""
+import argparse
+import time
+
+import ocr_engine
+from preprocessing import PROFILES, preprocess_image
+
+
+def render_all(paths, dpi, profile):
+    images = []
+    for path in paths:
+        for page in range(1, ocr_engine.page_count(path) + 1):
+            image = ocr_engine.render_page(path, page, dpi)
+            images.append(preprocess_image(image, profile))
+            image.close()
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+")
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("--batch", type=int, default=ocr_engine.OCR_BATCH_PAGES)
+    parser.add_argument("--profile", default="contrast", choices=sorted(PROFILES))
+    args = parser.parse_args()
+
+    images = render_all(args.pdfs, args.dpi, args.profile)
+    print(f"{len(images)} pages from {len(args.pdfs)} PDFs at {args.dpi} dpi")
+
+    start = time.perf_counter()
+    single = [ocr_engine.ocr_image(image) for image in images]
+    elapsed = time.perf_counter() - start
+    print(f"{'pytesseract':<12} {elapsed:>8.2f} s  {elapsed / len(images) * 1000:>8.0f} ms/page")
+
+    start = time.perf_counter()
+    batched = []
+    for i in range(0, len(images), args.batch):
+        batched.extend(ocr_engine.tesseract_batch(images[i:i + args.batch]))
+    elapsed = time.perf_counter() - start
+    print(f"{'batch x' + str(args.batch):<12} {elapsed:>8.2f} s  {elapsed / len(images) * 1000:>8.0f} ms/page")
+
+    same = sum(a.text.strip() == b.text.strip() for a, b in zip(single, batched))
+    print(f"identical text on {same}/{len(images)} pages")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+PDF text-layer extraction: pages per second and client match rate for each
+backend in pdf_text.PDF_TEXT_BACKENDS.
+
+Run it over a folder of real invoices with the live client list:
+    python benchmark_pdf_text.py C:\\path\\to\\invoices --clients "Client Names.csv"
+
+or generate a synthetic corpus first (text-layer invoices naming synthetic
+clients, some multi-page, some with a blank page):
+    python benchmark_pdf_text.py corpus --make-corpus 200
+
+Backends that aren't installed (pdftotext not on PATH, no PyMuPDF) are
+reported and skipped.
+"""
+import argparse
+import os
+import random
+import time
+
+import pandas as pd
+
+from benchmark_matching import FILLER, make_clients
+from client_matcher import ClientMatcher
+from pdf_text import PDF_TEXT_BACKENDS, has_text_layer
+from tokenized_text import TokenizedText
+
+
+def _pdf_string(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path, pages):
+    """A minimal PDF with one Helvetica text page per list of lines (empty list: blank page)."""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 11 Tf 14 TL 60 780 Td " + " ".join(f"({_pdf_string(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out, offsets = b"%PDF-1.4\n", []
+    for i, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{i} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_corpus(folder, count, rng, client_count=500):
+    os.makedirs(folder, exist_ok=True)
+    clients = make_clients(client_count, rng)
+    pd.DataFrame(clients, columns=["Name", "Code"]).to_csv(os.path.join(folder, "clients.csv"), index=False)
+    for i in range(count):
+        name = rng.choice(clients)[0] if rng.random() < 0.8 else "Unknown Person"
+        first = [f"Tax Invoice {rng.randint(1000, 99999)}", "Provider: Sunrise Support Services",
+                 f"Participant: {name}", f"NDIS number: 43{rng.randint(1000000, 9999999)}",
+                 f"Date: {rng.randint(1, 28)}/{rng.randint(1, 12)}/2024"]
+        pages = [first]
+        for _ in range(rng.choice([0, 0, 1, 3])):
+            pages.append([f"{rng.choice(FILLER)} {rng.randint(1, 40)} hours ${rng.randint(50, 900)}.00"
+                          for _ in range(rng.randint(5, 30))])
+        if rng.random() < 0.1:
+            pages.append([])
+        write_text_pdf(os.path.join(folder, f"invoice_{i:05d}.pdf"), pages)
+    return os.path.join(folder, "clients.csv")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("folder")
+    parser.add_argument("--clients", help="client CSV (name, code columns); defaults to the corpus's clients.csv")
+    parser.add_argument("--make-corpus", type=int, metavar="N", help="write N synthetic invoices into folder first")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    clients_csv = args.clients
+    if args.make_corpus:
+        clients_csv = clients_csv or make_corpus(args.folder, args.make_corpus, random.Random(args.seed))
+    clients_csv = clients_csv or os.path.join(args.folder, "clients.csv")
+    matcher = ClientMatcher.from_dataframe(pd.read_csv(clients_csv)) if os.path.exists(clients_csv) else None
+
+    pdfs = sorted(os.path.join(args.folder, f) for f in os.listdir(args.folder) if f.lower().endswith(".pdf"))
+    print(f"{len(pdfs)} PDFs, {'%d clients' % len(matcher) if matcher else 'no client list'}")
+    print(f"{'backend':<10} {'seconds':>8} {'pages/s':>8} {'errors':>7} {'text pages':>11} {'matched':>8}")
+    for name, backend in PDF_TEXT_BACKENDS.items():
+        pages = text_pages = errors = matched = 0
+        start = time.perf_counter()
+        try:
+            for path in pdfs:
+                try:
+                    texts = backend(path)
+                except (ImportError, FileNotFoundError):
+                    raise
+                except Exception:
+                    errors += 1
+                    continue
+                pages += len(texts)
+                usable = [text for text in texts if has_text_layer(text)]
+                text_pages += len(usable)
+                if matcher and usable and matcher.find_code(TokenizedText("".join(usable)))[0]:
+                    matched += 1
+        except (ImportError, FileNotFoundError) as e:
+            print(f"{name:<10} skipped ({e})")
+            continue
+        elapsed = time.perf_counter() - start
+        rate = f"{matched / len(pdfs):.0%}" if matcher and pdfs else "-"
+        print(f"{name:<10} {elapsed:>8.2f} {pages / elapsed if elapsed else 0:>8.0f} {errors:>7} "
+              f"{text_pages:>5}/{pages:<5} {rate:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Peak memory of page rendering on a large PDF.
+
+Compares
+  - legacy:  convert_from_path for the whole document, every page held as a
+             colour PIL image at once (the old extract_text_ocr/move_files path)
+  - stream:  ocr_engine.iter_pages, one greyscale page rendered through a temp
+             file and released after preprocessing
+
+Each mode runs in a fresh interpreter so peak RSS is its own. tracemalloc
+only sees Python/NumPy allocations, not PIL's image buffers, so RSS is the
+number that matters here (peak working set via psutil on Windows,
+ru_maxrss elsewhere).
+
+Usage:
+    python benchmark_rendering.py big_scan.pdf [--dpi 300] [--profile invert]
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import tracemalloc
+
+
+def peak_rss_mb() -> float:
+    """High-water mark of this process's resident memory, in MiB (NaN if it can't be read)."""
+    if sys.platform == "win32":
+        try:
+            import psutil
+        except ImportError:
+            return float("nan")
+        return psutil.Process().memory_info().peak_wset / 2**20
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and KiB elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def run_mode(mode, pdf, dpi, profile):
+    from preprocessing import preprocess_image
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == "legacy":
+        from pdf2image import convert_from_path
+        from PIL import Image
+        Image.MAX_IMAGE_PIXELS = None
+        images = convert_from_path(pdf, dpi=dpi)
+        for image in images:
+            preprocess_image(image, profile).close()
+        pages = len(images)
+    else:
+        import ocr_engine
+        pages = 0
+        for _, image in ocr_engine.iter_pages(pdf, range(1, ocr_engine.page_count(pdf) + 1), dpi):
+            preprocess_image(image, profile).close()
+            pages += 1
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    print(json.dumps({"pages": pages, "seconds": elapsed, "traced_mb": traced_peak / 2**20,
+                      "rss_mb": peak_rss_mb()}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdf")
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--profile", default="invert")
+    parser.add_argument("--mode", choices=["legacy", "stream"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args.mode, args.pdf, args.dpi, args.profile)
+        return
+
+    print(f"{args.pdf} at {args.dpi} dpi, profile {args.profile}")
+    for mode in ("legacy", "stream"):
+        out = subprocess.run([sys.executable, __file__, args.pdf, "--dpi", str(args.dpi),
+                              "--profile", args.profile, "--mode", mode],
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            print(f"{mode:<8} failed: {out.stderr.strip().splitlines()[-1] if out.stderr.strip() else out.returncode}")
+            continue
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{mode:<8} {r['pages']:>4} pages {r['seconds']:>8.2f} s  peak RSS {r['rss_mb']:>8.0f} MiB  "
+              f"traced {r['traced_mb']:>6.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
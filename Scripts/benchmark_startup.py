@@ -0,0 +1,61 @@
+"""
+Cold-start latency of the invoice sorter with each tokenizer backend.
+
+Every scenario runs in a fresh interpreter so module imports and model loads
+are measured from cold:
+  - GUI:       importing Main_Script, which is what GUI.py does before showing the window
+  - headless:  importing Main_Script and tokenising the first document
+  - eager:     the old behaviour, full en_core_web_sm pipeline loaded at import
+
+Usage:
+    python benchmark_startup.py [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = [
+    ("GUI (regex)", "regex", "import Main_Script"),
+    ("GUI (spacy, lazy)", "spacy", "import Main_Script"),
+    ("headless (regex)", "regex",
+     "import Main_Script, pytesseractBBKMSCRIPT as p; p.tokenize_document('Invoice for John Smith')"),
+    ("headless (spacy, lazy)", "spacy",
+     "import Main_Script, pytesseractBBKMSCRIPT as p; p.tokenize_document('Invoice for John Smith')"),
+    ("headless (spacy, eager full pipeline)", "regex",
+     "import spacy; spacy.load('en_core_web_sm'); import Main_Script"),
+]
+
+
+def time_scenario(backend, code, runs):
+    env = dict(os.environ, BBKM_TOKENIZER_BACKEND=backend)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS_DIR, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'scenario':<40} {'median s':>10} {'min s':>10}")
+    for label, backend, code in SCENARIOS:
+        try:
+            timings = time_scenario(backend, code, args.runs)
+        except subprocess.CalledProcessError as e:
+            print(f"{label:<40} failed ({e})")
+            continue
+        print(f"{label:<40} {statistics.median(timings):>10.3f} {min(timings):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
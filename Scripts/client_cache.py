@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+
+class ClientSnapshot:
+    """A parsed client table plus the matcher compiled from it."""
+
+    def __init__(self, data, key, matcher_factory=None):
+        self.data = data
+        self.key = key
+        self.loaded_at = time.time()
+        self._matcher_factory = matcher_factory
+        self._matcher = None
+
+    @property
+    def matcher(self):
+        if self._matcher is None:
+            if self._matcher_factory is None:
+                raise RuntimeError("No matcher factory was given to this client table cache")
+            self._matcher = self._matcher_factory(self.data)
+        return self._matcher
+
+
+class ClientTableCache:
+    """
+    Keeps the parsed Client Names.csv (and its compiled matcher) in memory.
+
+    `get()` only re-reads the file when its size or mtime has changed since the
+    last load. If the file can't be read, for example while Excel has it
+    locked, the last good snapshot keeps being served; the error is raised
+    only if nothing has been loaded yet.
+    """
+
+    def __init__(self, csv_path, loader, matcher_factory=None):
+        self.csv_path = csv_path
+        self.loader = loader
+        self.matcher_factory = matcher_factory
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _stat_key(self):
+        st = os.stat(self.csv_path)
+        return st.st_size, st.st_mtime_ns
+
+    def get(self):
+        with self._lock:
+            snapshot = self._snapshot
+            try:
+                key = self._stat_key()
+                if snapshot is not None and snapshot.key == key:
+                    return snapshot
+                data = self.loader(self.csv_path)
+            except (OSError, ValueError) as e:
+                # ValueError covers pandas parse errors on a half-written file
+                if snapshot is None:
+                    raise
+                print(f"Could not reload {os.path.basename(self.csv_path)} ({e}). Using the copy loaded at "
+                      f"{time.strftime('%H:%M:%S', time.localtime(snapshot.loaded_at))}.")
+                return snapshot
+
+            self._snapshot = ClientSnapshot(data, key, self.matcher_factory)
+            return self._snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
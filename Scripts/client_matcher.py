@@ -0,0 +1,206 @@
+import hashlib
+import re
+from collections import defaultdict, namedtuple
+
+from aho_corasick import AhoCorasick
+from fuzzy_index import SymSpellIndex
+from tokenized_text import TokenizedText, clean_text
+
+# Words dropped from client names before matching
+TITLES = ['mr', 'mrs', 'miss', 'master', 'NDIS']
+
+# How many tokens apart the first name part and a later part may sit
+PROXIMITY = 5
+
+# Automaton payload kinds
+_PHRASE = 0   # "first last" / "last first", word bounded
+_JOINED = 1   # "firstlast" followed by optional digits, word bounded
+
+
+# Fuzzy hit for one client row; confidence is in (0, 1]
+FuzzyMatch = namedtuple("FuzzyMatch", ["row", "code", "confidence"])
+
+
+def name_parts(name):
+    """Lowercased name parts with titles removed."""
+    return [part.lower() for part in clean_text(name).split() if part.lower() not in TITLES]
+
+
+def _is_word(ch):
+    return ch.isalnum() or ch == '_'
+
+
+class ClientMatcher:
+    """
+    Client-name index built once from the client table.
+
+    For every client row the normalised name variants are compiled into a single
+    Aho-Corasick automaton:
+      - forward name      ("john smith")
+      - reversed name     ("smith john"); "Smith, John" reduces to this once
+                          punctuation is stripped
+      - FirstLast+digits  ("johnsmith", "johnsmith123")
+    and the first name part of the forward and reversed forms is put into a
+    token index for the "parts close together" check.
+
+    `find_rows` answers which client rows appear in a text with one pass of the
+    automaton and one pass over the tokens. Pass a `TokenizedText` to reuse a
+    document that has already been tokenised. The semantics match the old
+    per-client `find_name_match` loop (kept in legacy_matching.py); `find_code`
+    returns the first matching row in CSV order, like `find_name_code_match`
+    always did.
+    """
+
+    def __init__(self, rows, tokenizer=None, proximity=PROXIMITY):
+        self.tokenizer = tokenizer
+        self.proximity = proximity
+        self.names = []
+        self.codes = []
+        self._automaton = AhoCorasick()
+        self._first_tokens = defaultdict(list)
+        # Rows whose name is nothing but titles/punctuation. The old regex
+        # degenerated to r'\b\b' for these, which matches any non-blank text.
+        self._catch_all_rows = []
+        digest = hashlib.sha256()
+
+        for row, (name, code) in enumerate(rows):
+            name = str(name)
+            self.names.append(name)
+            self.codes.append(code)
+            digest.update(f"{name}\x1f{code}\x1e".encode('utf-8', 'replace'))
+
+            parts = name_parts(name)
+            if not parts:
+                self._catch_all_rows.append(row)
+                continue
+            reversed_parts = parts[::-1]
+
+            self._automaton.add(' '.join(parts), (row, _PHRASE))
+            if reversed_parts != parts:
+                self._automaton.add(' '.join(reversed_parts), (row, _PHRASE))
+
+            if len(parts) >= 2:
+                self._automaton.add(parts[0] + parts[1], (row, _JOINED))
+                self._first_tokens[parts[0]].append((row, parts))
+                if reversed_parts != parts:
+                    self._first_tokens[reversed_parts[0]].append((row, reversed_parts))
+
+        self._automaton.build()
+        self._fuzzy_index = None
+        # Changes whenever a client is added, removed, renamed or re-coded
+        self.version = digest.hexdigest()
+
+    @classmethod
+    def from_dataframe(cls, excel_data, tokenizer=None, proximity=PROXIMITY):
+        """Build from a client table whose first two columns are name and code."""
+        return cls(zip(excel_data.iloc[:, 0], excel_data.iloc[:, 1]), tokenizer, proximity)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def tokenize(self, text):
+        if isinstance(text, TokenizedText):
+            return text
+        return TokenizedText(text, self.tokenizer)
+
+    def _phrase_rows(self, lowered):
+        rows = set()
+        size = len(lowered)
+        for start, end, (row, kind) in self._automaton.iter_matches(lowered):
+            if row in rows:
+                continue
+            if start > 0 and _is_word(lowered[start - 1]):
+                continue
+            if kind == _JOINED:
+                while end < size and lowered[end].isdecimal():
+                    end += 1
+            if end < size and _is_word(lowered[end]):
+                continue
+            rows.add(row)
+        return rows
+
+    def _proximity_rows(self, tokens):
+        rows = set()
+        size = len(tokens)
+        for i, token in enumerate(tokens):
+            candidates = self._first_tokens.get(token)
+            if not candidates:
+                continue
+            for row, parts in candidates:
+                if row in rows:
+                    continue
+                last = min(len(parts) - 1, self.proximity)
+                for j in range(1, last + 1):
+                    if i + j < size and tokens[i + j] == parts[j]:
+                        rows.add(row)
+                        break
+        return rows
+
+    def find_rows(self, text):
+        """Sorted row indices of every client whose name appears in `text`."""
+        doc = self.tokenize(text)
+        rows = self._phrase_rows(doc.lowered)
+        rows |= self._proximity_rows(doc.tokens)
+        if self._catch_all_rows and re.search(r'\w', doc.cleaned):
+            rows.update(self._catch_all_rows)
+        return sorted(rows)
+
+    def find_codes(self, text):
+        """Client codes found in `text`, in CSV order."""
+        return [self.codes[row] for row in self.find_rows(text)]
+
+    @property
+    def fuzzy_index(self):
+        # Built on first use; most documents resolve on an exact match
+        if self._fuzzy_index is None:
+            self._fuzzy_index = SymSpellIndex(self._first_tokens_all())
+        return self._fuzzy_index
+
+    def _first_tokens_all(self):
+        for candidates in self._first_tokens.values():
+            for _, parts in candidates:
+                yield from parts
+
+    def find_fuzzy(self, text):
+        """
+        Clients whose name parts appear close together in `text` allowing for
+        OCR errors, as [FuzzyMatch] sorted best first. Uses the same proximity
+        rule as the exact check, but each token is compared through the
+        approximate index. A row's confidence is the product of the confidences
+        of its two matched tokens.
+        """
+        doc = self.tokenize(text)
+        index = self.fuzzy_index
+        lookups = {}
+        for token in set(doc.tokens):
+            if token.strip():
+                lookups[token] = dict(index.lookup(token))
+
+        size = len(doc.tokens)
+        best = {}
+        for i, token in enumerate(doc.tokens):
+            first_hits = lookups.get(token)
+            if not first_hits:
+                continue
+            for first_word, first_conf in first_hits.items():
+                for row, parts in self._first_tokens.get(first_word, ()):
+                    last = min(len(parts) - 1, self.proximity)
+                    for j in range(1, last + 1):
+                        if i + j >= size:
+                            break
+                        conf = lookups.get(doc.tokens[i + j], {}).get(parts[j])
+                        if conf is None:
+                            continue
+                        confidence = first_conf * conf
+                        if confidence > best.get(row, 0):
+                            best[row] = confidence
+        matches = [FuzzyMatch(row, self.codes[row], confidence) for row, confidence in best.items()]
+        matches.sort(key=lambda m: (-m.confidence, m.row))
+        return matches
+
+    def find_code(self, text):
+        """(True, code) for the first client in CSV order that matches, else (False, None)."""
+        rows = self.find_rows(text)
+        if rows:
+            return True, self.codes[rows[0]]
+        return False, None
@@ -0,0 +1,131 @@
+from collections import defaultdict
+
+# Character sequences Tesseract commonly confuses. Both the indexed words and
+# the looked-up tokens are folded the same way, so "srnith" reaches "smith".
+OCR_CONFUSIONS = [
+    ("rn", "m"),
+    ("vv", "w"),
+    ("cl", "d"),
+    ("0", "o"),
+    ("1", "l"),
+    ("5", "s"),
+]
+
+# Confidence given to a token that only differs by known OCR confusions
+OCR_FOLD_CONFIDENCE = 0.95
+
+# Tokens shorter than this are only ever matched exactly
+MIN_FUZZY_LENGTH = 4
+
+
+def ocr_fold(word):
+    for wrong, right in OCR_CONFUSIONS:
+        word = word.replace(wrong, right)
+    return word
+
+
+def max_distance_for(word):
+    return 1 if len(word) <= 6 else 2
+
+
+def _deletes(word, max_distance):
+    """Every string reachable from `word` by deleting up to `max_distance` characters."""
+    result = {word}
+    frontier = {word}
+    for _ in range(max_distance):
+        nxt = set()
+        for w in frontier:
+            if len(w) <= 1:
+                continue
+            for i in range(len(w)):
+                nxt.add(w[:i] + w[i + 1:])
+        nxt -= result
+        result |= nxt
+        frontier = nxt
+    return result
+
+
+def edit_distance(a, b, max_distance):
+    """
+    Optimal-string-alignment distance between `a` and `b`, or max_distance + 1
+    as soon as it is known to exceed `max_distance`.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev_prev = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        row_min = cur[0]
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if (prev_prev is not None and i > 1 and j > 1
+                    and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]):
+                cur[j] = min(cur[j], prev_prev[j - 2] + 1)
+            row_min = min(row_min, cur[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        prev_prev, prev = prev, cur
+    return prev[-1]
+
+
+class SymSpellIndex:
+    """
+    Approximate lookup over a fixed vocabulary (client name tokens) using the
+    SymSpell symmetric-delete scheme. Every word is indexed under all of its
+    deletes up to its maximum edit distance, so a lookup only generates the
+    deletes of the query and verifies the handful of candidates that share one,
+    instead of computing edit distance against every word.
+    """
+
+    def __init__(self, words, min_length=MIN_FUZZY_LENGTH):
+        self.min_length = min_length
+        self.words = set()
+        self._by_fold = defaultdict(set)
+        self._deletes = defaultdict(set)
+        for word in words:
+            self.add(word)
+
+    def add(self, word):
+        if word in self.words:
+            return
+        self.words.add(word)
+        if len(word) < self.min_length:
+            return
+        folded = ocr_fold(word)
+        if folded not in self._by_fold:
+            for delete in _deletes(folded, max_distance_for(folded)):
+                self._deletes[delete].add(folded)
+        self._by_fold[folded].add(word)
+
+    def lookup(self, token):
+        """
+        [(word, confidence)] for every indexed word within edit distance of
+        `token`, best first. Confidence is 1.0 for an exact hit,
+        OCR_FOLD_CONFIDENCE when the words differ only by known OCR confusions,
+        and 1 - distance / length otherwise.
+        """
+        if len(token) < self.min_length:
+            return [(token, 1.0)] if token in self.words else []
+
+        folded = ocr_fold(token)
+        max_distance = max_distance_for(folded)
+        candidates = set()
+        for delete in _deletes(folded, max_distance):
+            candidates |= self._deletes.get(delete, set())
+
+        hits = {}
+        for candidate in candidates:
+            distance = edit_distance(folded, candidate, max_distance)
+            if distance > max_distance:
+                continue
+            if distance == 0:
+                base = OCR_FOLD_CONFIDENCE
+            else:
+                base = min(OCR_FOLD_CONFIDENCE, 1 - distance / max(len(folded), len(candidate)))
+            for word in self._by_fold[candidate]:
+                confidence = 1.0 if word == token else base
+                if confidence > hits.get(word, 0):
+                    hits[word] = confidence
+        return sorted(hits.items(), key=lambda hit: (-hit[1], hit[0]))
@@ -0,0 +1,117 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# Statements are kept as constants so sqlite3's statement cache prepares each once per connection
+_SEEN_RECENTLY = "SELECT 1 FROM file_history WHERE sha256=? AND last_seen_utc>?"
+_RECORD = """
+    INSERT INTO file_history (sha256, size, first_seen_utc, last_seen_utc, last_path)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(sha256) DO UPDATE SET
+        last_seen_utc=excluded.last_seen_utc,
+        last_path=excluded.last_path,
+        size=COALESCE(excluded.size, size)
+"""
+_CACHED_HASH = "SELECT sha256 FROM hash_cache WHERE path=? AND size=? AND mtime_ns=? AND file_id=?"
+_STORE_HASH = """
+    INSERT OR REPLACE INTO hash_cache (path, size, mtime_ns, file_id, sha256, checked_utc)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+
+class HistoryStore:
+    """
+    file_history.sqlite behind one long-lived connection in WAL mode.
+
+    Reads run straight away. Writes made inside `batch()` share one
+    transaction that is committed when the batch ends (once per sweep);
+    outside a batch each write commits on its own. The connection sees its
+    own uncommitted rows, so a duplicate check later in the same sweep
+    already sees files recorded earlier in it.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._con = None
+        self._lock = threading.RLock()
+        self._batch_depth = 0
+
+    def _connection(self):
+        if self._con is None:
+            # Opened lazily; Main_Script may run in a GUI worker thread
+            con = sqlite3.connect(self.db_path, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS file_history (
+                    sha256 TEXT PRIMARY KEY,
+                    size INTEGER,
+                    first_seen_utc INTEGER,
+                    last_seen_utc INTEGER,
+                    last_path TEXT
+                )
+            """)
+            # The 90-day duplicate window filters on last_seen_utc
+            con.execute("CREATE INDEX IF NOT EXISTS idx_file_history_last_seen ON file_history (last_seen_utc)")
+            # Last known hash per path; a row is only trusted while size, mtime and file id match
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS hash_cache (
+                    path TEXT PRIMARY KEY,
+                    size INTEGER,
+                    mtime_ns INTEGER,
+                    file_id TEXT,
+                    sha256 TEXT,
+                    checked_utc INTEGER
+                )
+            """)
+            # Paths that haven't been looked at in 90 days have long since moved on
+            cutoff = int((datetime.utcnow() - timedelta(days=90)).timestamp())
+            con.execute("DELETE FROM hash_cache WHERE checked_utc<?", (cutoff,))
+            con.commit()
+            self._con = con
+        return self._con
+
+    def _write(self, sql: str, params):
+        with self._lock:
+            con = self._connection()
+            con.execute(sql, params)
+            if not self._batch_depth:
+                con.commit()
+
+    @contextmanager
+    def batch(self):
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                if not self._batch_depth and self._con is not None:
+                    self._con.commit()
+
+    def seen_recently(self, file_hash: str, days: int = 90) -> bool:
+        cutoff = int((datetime.utcnow() - timedelta(days=days)).timestamp())
+        with self._lock:
+            return self._connection().execute(_SEEN_RECENTLY, (file_hash, cutoff)).fetchone() is not None
+
+    def record(self, path: str, file_hash: str, size=None):
+        now = int(datetime.utcnow().timestamp())
+        self._write(_RECORD, (file_hash, size, now, now, path))
+
+    def cached_hash(self, path: str, key):
+        with self._lock:
+            row = self._connection().execute(_CACHED_HASH, (path, *key)).fetchone()
+        return row[0] if row else None
+
+    def store_hash(self, path: str, key, file_hash: str):
+        now = int(datetime.utcnow().timestamp())
+        self._write(_STORE_HASH, (path, *key, file_hash, now))
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self._con.commit()
+                self._con.close()
+                self._con = None
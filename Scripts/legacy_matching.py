@@ -0,0 +1,73 @@
+"""
+The original per-client name check, kept as the reference that ClientMatcher
+is measured and checked against (see benchmark_matching.py). Matching one
+document meant calling find_name_match once for every client row, in CSV order.
+"""
+import re
+
+from tokenized_text import TokenizedText
+
+
+def find_name_match(name, text, proximity=5):
+    # Tokenise the text unless the caller already did it for this document
+    doc = text if isinstance(text, TokenizedText) else TokenizedText(text)
+    text = doc.cleaned
+    name = re.sub(r'[^\w\s]', '', name).strip().replace(':', '').replace('NDIS', '')
+
+    # Split the name into parts, ignoring titles
+    name_parts = [part.lower() for part in name.split() if part.lower() not in ['mr', 'mrs', 'miss', 'master', 'NDIS']]
+    
+    # Generate the reversed name (last name first)
+    reversed_name_parts = name_parts[::-1]
+
+    text_parts = doc.tokens
+
+    # Check for an exact match first
+    exact_match_pattern = r'\b' + ' '.join(name_parts) + r'\b'
+    reversed_match_pattern = r'\b' + ' '.join(reversed_name_parts) + r'\b'
+
+    if re.search(exact_match_pattern, text, re.IGNORECASE):
+        return True
+
+    if re.search(reversed_match_pattern, text, re.IGNORECASE):
+        return True
+
+    # Check if the name is in "Lastname, Firstname" format
+    if len(reversed_name_parts) >= 2:  # Ensure there are at least two elements in reversed_name_parts
+        lastname_firstname_pattern = r'\b' + reversed_name_parts[0] + r', ' + reversed_name_parts[1] + r'\b'
+        if re.search(lastname_firstname_pattern, text, re.IGNORECASE):
+            return True
+
+    # Check for the "FirstnameLastnameNumbers" format
+    if len(name_parts) >= 2:  # Ensure there are at least two elements in name_parts
+        firstname_lastname_numbers_pattern = r'\b' + name_parts[0] + name_parts[1] + r'\d*\b'
+        if re.search(firstname_lastname_numbers_pattern, text, re.IGNORECASE):
+            return True
+
+    # Check if the name parts are close together (both normal and reversed)
+    for i in range(len(text_parts)):
+        if len(name_parts) > 0 and name_parts[0] == text_parts[i]:  # Ensure name_parts is not empty
+            for j in range(1, len(name_parts)):
+                if i + j < len(text_parts) and name_parts[j] == text_parts[i + j]:
+                    if j <= proximity:
+                        return True
+                    else:
+                        break
+
+        if len(reversed_name_parts) > 0 and reversed_name_parts[0] == text_parts[i]:  # Ensure reversed_name_parts is not empty
+            for j in range(1, len(reversed_name_parts)):
+                if i + j < len(text_parts) and reversed_name_parts[j] == text_parts[i + j]:
+                    if j <= proximity:
+                        return True
+                    else:
+                        break
+
+    return False
+
+
+def find_name_code_match(text, clients):
+    """(True, code) for the first (name, code) row whose name is in `text`, else (False, None)."""
+    for name, code in clients:
+        if find_name_match(name, text):
+            return True, code
+    return False, None
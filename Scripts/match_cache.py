@@ -0,0 +1,78 @@
+import hashlib
+import sqlite3
+from collections import namedtuple
+from datetime import datetime
+
+# Lives next to file_history.sqlite
+MATCH_CACHE_DB_PATH = r"C:\BBKM_InvoiceSorter\match_cache.sqlite"
+
+# code is None for a cached "no match"
+CachedMatch = namedtuple("CachedMatch", ["method", "code"])
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class MatchCache:
+    """
+    Persistent client-match results keyed by the PDF's SHA-256, so a document
+    that comes round again (Failed -> Attempt Code -> Invoices, re-sent
+    emails, restarts) isn't run through PyPDF2 and OCR a second time.
+
+    Each row stores the extraction method that decided the result and the
+    matched code, or NULL for "no match". A "no match" is only trusted while
+    the client list is the one it was computed against; a hit is trusted
+    while its code is still in the client list.
+    """
+
+    def __init__(self, db_path: str = MATCH_CACHE_DB_PATH):
+        self.db_path = db_path
+        con = sqlite3.connect(self.db_path)
+        con.execute("""
+            CREATE TABLE IF NOT EXISTS match_cache (
+                sha256 TEXT PRIMARY KEY,
+                method TEXT,
+                code TEXT,
+                client_version TEXT,
+                updated_utc INTEGER
+            )
+        """)
+        con.commit()
+        con.close()
+
+    def lookup(self, file_hash: str, client_matcher):
+        con = sqlite3.connect(self.db_path)
+        row = con.execute(
+            "SELECT method, code, client_version FROM match_cache WHERE sha256=?", (file_hash,)
+        ).fetchone()
+        con.close()
+        if row is None:
+            return None
+
+        method, code, client_version = row
+        if code is None:
+            # Negative result: re-run once the client list has changed
+            return CachedMatch(method, None) if client_version == client_matcher.version else None
+        if client_version == client_matcher.version or code in {str(c) for c in client_matcher.codes}:
+            return CachedMatch(method, code)
+        return None
+
+    def record(self, file_hash: str, method: str, code, client_matcher):
+        now = int(datetime.utcnow().timestamp())
+        con = sqlite3.connect(self.db_path)
+        con.execute("""
+            INSERT INTO match_cache (sha256, method, code, client_version, updated_utc)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(sha256) DO UPDATE SET
+                method=excluded.method,
+                code=excluded.code,
+                client_version=excluded.client_version,
+                updated_utc=excluded.updated_utc
+        """, (file_hash, method, None if code is None else str(code), client_matcher.version, now))
+        con.commit()
+        con.close()
@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Lives next to file_history.sqlite
+OCR_CACHE_DB_PATH = r"C:\BBKM_InvoiceSorter\ocr_cache.sqlite"
+
+# Region name stored for a full-page OCR result
+FULL_PAGE = ""
+
+# Pages OCR'd longer ago than this are dropped; a document that comes back
+# after that is simply OCR'd again
+OCR_CACHE_MAX_AGE_DAYS = int(os.getenv("BBKM_OCR_CACHE_DAYS", "90"))
+# Hard cap on cached page texts, oldest dropped first (a page is a few KB)
+OCR_CACHE_MAX_ROWS = int(os.getenv("BBKM_OCR_CACHE_MAX_ROWS", "200000"))
+# How often a long-running process prunes again
+OCR_CACHE_PRUNE_SECONDS = 3600
+
+_GET_PAGES = ("SELECT page, text, confidence FROM ocr_text WHERE sha256=? AND dpi=? AND profile=? AND region=? "
+              "AND page IN ({})")
+_PUT = """
+    INSERT OR REPLACE INTO ocr_text (sha256, page, dpi, profile, region, text, confidence, created_utc)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+class OcrTextCache:
+    """
+    Tesseract output keyed by (PDF SHA-256, page, dpi, preprocessing profile,
+    region). The key is the file's content, not its path, so the text survives
+    renames and moves between Invoices, Failed, Attempt Code and the routing
+    stage; a hit skips rendering and Tesseract for that page.
+
+    One connection per process (get_text_cache), in WAL mode. Rows older
+    than OCR_CACHE_MAX_AGE_DAYS, and the oldest rows beyond OCR_CACHE_MAX_ROWS,
+    are pruned when it opens and then at most once an hour.
+    """
+
+    def __init__(self, db_path: str = OCR_CACHE_DB_PATH):
+        self.db_path = db_path
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+        self._con = None
+        self._lock = threading.RLock()
+        self._last_prune = 0.0
+        # Opens the database, so a broken one fails here rather than on the first page
+        self.prune()
+
+    def _connection(self):
+        if self._con is None:
+            # check_same_thread: Main_Script may run in a GUI worker thread
+            con = sqlite3.connect(self.db_path, check_same_thread=False)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            con.execute("""
+                CREATE TABLE IF NOT EXISTS ocr_text (
+                    sha256 TEXT,
+                    page INTEGER,
+                    dpi INTEGER,
+                    profile TEXT,
+                    region TEXT,
+                    text TEXT,
+                    confidence REAL,
+                    created_utc INTEGER,
+                    PRIMARY KEY (sha256, page, dpi, profile, region)
+                )
+            """)
+            try:
+                # Caches created before confidences were stored
+                con.execute("ALTER TABLE ocr_text ADD COLUMN confidence REAL")
+            except sqlite3.OperationalError:
+                pass
+            # Pruning goes oldest first
+            con.execute("CREATE INDEX IF NOT EXISTS idx_ocr_text_created ON ocr_text (created_utc)")
+            con.commit()
+            self._con = con
+        return self._con
+
+    def prune(self):
+        """Drop expired rows and the oldest rows over the size cap; returns how many went."""
+        with self._lock:
+            con = self._connection()
+            cutoff = int((datetime.utcnow() - timedelta(days=OCR_CACHE_MAX_AGE_DAYS)).timestamp())
+            removed = con.execute("DELETE FROM ocr_text WHERE created_utc<?", (cutoff,)).rowcount
+            excess = con.execute("SELECT COUNT(*) FROM ocr_text").fetchone()[0] - OCR_CACHE_MAX_ROWS
+            if excess > 0:
+                removed += con.execute(
+                    "DELETE FROM ocr_text WHERE rowid IN (SELECT rowid FROM ocr_text ORDER BY created_utc LIMIT ?)",
+                    (excess,),
+                ).rowcount
+            con.commit()
+            self._last_prune = time.monotonic()
+            self.pruned += removed
+            return removed
+
+    def _maybe_prune(self):
+        if time.monotonic() - self._last_prune >= OCR_CACHE_PRUNE_SECONDS:
+            self.prune()
+
+    def get_pages(self, file_hash: str, pages, dpi: int, profile: str, region: str = FULL_PAGE) -> dict:
+        """{page: (text, confidence)} for the requested pages that are cached."""
+        pages = list(pages)
+        if not pages:
+            return {}
+        with self._lock:
+            rows = self._connection().execute(
+                _GET_PAGES.format(','.join('?' * len(pages))),
+                (file_hash, dpi, profile, region, *pages),
+            ).fetchall()
+        self.hits += len(rows)
+        self.misses += len(pages) - len(rows)
+        return {page: (text, confidence) for page, text, confidence in rows}
+
+    def put(self, file_hash: str, page: int, dpi: int, profile: str, text: str, region: str = FULL_PAGE,
+            confidence=None):
+        now = int(datetime.utcnow().timestamp())
+        with self._lock:
+            self._maybe_prune()
+            con = self._connection()
+            con.execute(_PUT, (file_hash, page, dpi, profile, region, text, confidence, now))
+            con.commit()
+
+    def close(self):
+        with self._lock:
+            if self._con is not None:
+                self._con.close()
+                self._con = None
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = f"{self.hits / lookups:.0%}" if lookups else "n/a"
+        pruned = f", {self.pruned} old pages pruned" if self.pruned else ""
+        return f"OCR cache: {self.hits}/{lookups} page hits ({rate}){pruned}"
@@ -0,0 +1,776 @@
+import atexit
+import os
+import sqlite3
+import subprocess
+import tempfile
+import time
+from collections import Counter, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from itertools import islice
+from typing import Any, Callable, Optional
+
+from pdf2image import convert_from_path, pdfinfo_from_path
+from pytesseract import Output, image_to_data, image_to_string, pytesseract
+from pytesseract.pytesseract import subprocess_args
+from PIL import Image
+
+from match_cache import file_sha256
+from ocr_cache import FULL_PAGE, OcrTextCache
+from preprocessing import merge_profile_stats, preprocess_image, take_profile_stats
+
+pytesseract.tesseract_cmd = r"C:\BBKM_InvoiceSorter\Library\Tesseract-OCR\tesseract.exe"
+
+# Resolution used for client-name OCR
+OCR_DPI = 300
+
+# Adaptive resolution: most typed invoices read fine at 150 dpi, so start
+# there and only re-OCR at the next tier when the matcher found nothing
+CLIENT_DPI_TIERS = (150, 300)
+
+# Documents resolved per (stage, dpi); dpi None means no tier matched and
+# "clean" counts documents not escalated because the OCR was already confident
+TIER_STATS = Counter()
+
+# Read pages with image_to_data so every page carries Tesseract's mean word
+# confidence (0-100); BBKM_OCR_WORD_DATA=0 goes back to plain image_to_string
+OCR_WORD_DATA = os.getenv("BBKM_OCR_WORD_DATA", "1") != "0"
+
+# A document that found nothing is only re-read at the next tier when its
+# mean confidence is below OCR_ESCALATE_CONFIDENCE: a clean read that has no
+# client or vendor name in it won't grow one at a higher dpi. A read below
+# OCR_REVIEW_CONFIDENCE still gets the higher tiers (that's where a poor scan
+# gains most), but if the last tier is still below it the scan is treated as
+# unreadable and goes to manual review.
+OCR_ESCALATE_CONFIDENCE = float(os.getenv("BBKM_OCR_ESCALATE_CONFIDENCE", "80"))
+OCR_REVIEW_CONFIDENCE = float(os.getenv("BBKM_OCR_REVIEW_CONFIDENCE", "40"))
+
+# Page-1 regions OCR'd before any full-page pass, as (left, top, right, bottom)
+# fractions of the page. Participant names and vendor letterheads nearly always
+# sit in one of these.
+OCR_REGIONS = [
+    ("header", (0.0, 0.0, 1.0, 0.33)),
+    ("bill_to", (0.0, 0.15, 0.6, 0.5)),
+]
+
+# Region pass counters per (stage, region name); "documents" counts attempts
+REGION_STATS = Counter()
+
+# Worker processes for page-level OCR; 1 keeps everything in-process
+OCR_WORKERS = int(os.getenv("BBKM_OCR_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+
+# Tesseract's own OpenMP threads inside each worker. With one page per core
+# already, letting every Tesseract spin up more threads just oversubscribes.
+OCR_OMP_THREAD_LIMIT = os.getenv("BBKM_OMP_THREAD_LIMIT", "1")
+
+# "pytesseract" runs one tesseract.exe per page; "batch" renders up to
+# OCR_BATCH_PAGES pages of a document and reads them in a single tesseract
+# run (list-file input), paying process start and model load once per batch
+OCR_BACKEND = os.getenv("BBKM_OCR_BACKEND", "pytesseract")
+OCR_BATCH_PAGES = int(os.getenv("BBKM_OCR_BATCH_PAGES", "4"))
+
+# Persistent page-text cache shared by the rename and routing stages; BBKM_OCR_CACHE=0 turns it off
+OCR_CACHE_ENABLED = os.getenv("BBKM_OCR_CACHE", "1") != "0"
+
+# Pages each stage looks at, as (first n, last n); None reads every page.
+# Vendor letterheads and "NDIS activity statement" titles sit on page 1, so a
+# 60-page bulk statement only needs its first two pages and the last.
+STAGE_PAGE_BUDGETS = {
+    "client": None,
+    "vendor": (2, 1),
+}
+
+# Pages of one document that may be newly OCR'd in one sweep. A longer
+# document is read in chunks across Main_Script loops: the pages already done
+# come back from the OCR cache and the next chunk is read.
+OCR_CHUNK_PAGES = int(os.getenv("BBKM_OCR_CHUNK_PAGES", "20"))
+
+# Memory allowed for the pages of one document that are in flight at once
+# (one per worker, or a batch per worker with the batch backend). The pool
+# runs fewer pages at once if all of them wouldn't fit; a page that still
+# doesn't fit its share is rendered at a lower dpi instead.
+OCR_DOCUMENT_MEMORY_MB = int(os.getenv("BBKM_OCR_MEMORY_MB", "1024"))
+
+# A rendered greyscale page costs 1 byte a pixel; preprocessing (the 3x3
+# median keeps nine shifted copies) and the OCR copy push the peak to about this
+PAGE_BYTES_PER_PIXEL = 12
+
+# Every page in flight is given room for an A4 page at 300 dpi (the top tier;
+# a Letter page is smaller), so concurrency is capped rather than the top tier
+# downscaled. A4 is 2481x3508 at 300 dpi; the slack covers scanners whose
+# mediabox is a few points over.
+MIN_PAGE_PIXELS = 2520 * 3540
+
+
+def max_pages_in_flight() -> int:
+    """Pages of one document that fit OCR_DOCUMENT_MEMORY_MB at MIN_PAGE_PIXELS each (at least 1)."""
+    return max(1, OCR_DOCUMENT_MEMORY_MB * 2**20 // (MIN_PAGE_PIXELS * PAGE_BYTES_PER_PIXEL))
+
+
+def page_pixel_budget(in_flight: int = 1) -> int:
+    """Pixels one rendered page may have when `in_flight` pages share OCR_DOCUMENT_MEMORY_MB."""
+    return OCR_DOCUMENT_MEMORY_MB * 2**20 // (max(1, in_flight) * PAGE_BYTES_PER_PIXEL)
+
+
+class PdfRenderError(Exception):
+    """The PDF could not be opened or rasterised (treated as corrupt)."""
+
+
+# One page of OCR work; jobs from different documents can share a pool.
+# max_pixels is the page's share of the memory ceiling (see render_page).
+PageJob = namedtuple("PageJob", ["file_path", "page", "dpi", "profile", "max_pixels"], defaults=[None])
+
+# OCR output for one page; confidence is None when it isn't known (plain
+# image_to_string, or a page with no words on it)
+PageText = namedtuple("PageText", ["text", "confidence"])
+
+# One recognised word with its box in page pixels
+Word = namedtuple("Word", ["text", "confidence", "left", "top", "width", "height"])
+
+# Several crops of one rendered page, OCR'd separately
+RegionJob = namedtuple("RegionJob", ["file_path", "page", "dpi", "profile", "regions"])
+
+
+@dataclass
+class OcrStats:
+    """Per-document OCR counters."""
+    file_path: str
+    dpi: int = OCR_DPI
+    pages_total: int = 0
+    pages_processed: int = 0
+    pages_text_layer: int = 0
+    pages_deferred: int = 0
+    matched_page: Optional[int] = None
+    region: Optional[str] = None
+    confidence: Optional[float] = None
+    seconds: float = 0.0
+    # Set when the read failed part-way; "no match" then means "not read", not "not there"
+    error: Optional[str] = None
+
+    def summary(self) -> str:
+        if self.error:
+            return f"OCR failed after {self.pages_processed}/{self.pages_total} pages ({self.error}): {self.file_path}"
+        if self.region:
+            outcome = f"match in page {self.matched_page} {self.region} region"
+        elif self.matched_page:
+            outcome = f"match on page {self.matched_page}"
+        else:
+            outcome = "no match"
+        text_layer = f" ({self.pages_text_layer} from text layer)" if self.pages_text_layer else ""
+        confidence = f", confidence {self.confidence:.0f}" if self.confidence is not None else ""
+        if self.pages_deferred:
+            outcome += f", {self.pages_deferred} pages left for the next sweep"
+        return (f"OCR {self.pages_processed}/{self.pages_total} pages{text_layer} at {self.dpi} dpi, "
+                f"{outcome}{confidence}, {self.seconds:.1f}s: {self.file_path}")
+
+
+@dataclass
+class OcrResult:
+    text: str
+    match: Any
+    stats: OcrStats
+
+
+# -------------------- Rendering & OCR --------------------
+_page_counts = {}
+
+
+def page_count(file_path: str) -> int:
+    """Page count from pdfinfo (no rendering), remembered per file version."""
+    try:
+        st = os.stat(file_path)
+        key = (os.path.normcase(os.path.abspath(file_path)), st.st_size, st.st_mtime_ns)
+        if key not in _page_counts:
+            if len(_page_counts) > 1000:
+                _page_counts.clear()
+            _page_counts[key] = int(pdfinfo_from_path(file_path)["Pages"])
+        return _page_counts[key]
+    except Exception as e:
+        raise PdfRenderError(f"{file_path}: {e}") from e
+
+
+def plan_pages(total: int, budget=None) -> list:
+    """Pages to read out of `total` under a (first n, last n) budget; None means all."""
+    if budget is None:
+        return list(range(1, total + 1))
+    first, last = budget
+    return sorted(set(range(1, min(first, total) + 1)) | set(range(max(1, total - last + 1), total + 1)))
+
+
+def stage_pages(file_path: str, stage: str) -> list:
+    return plan_pages(page_count(file_path), STAGE_PAGE_BUDGETS.get(stage))
+
+
+def _pgm_size(path: str):
+    # pdftoppm -gray writes binary PGM: "P5\n<width> <height>\n255\n"
+    with open(path, "rb") as f:
+        magic, width, height = f.read(64).split(maxsplit=3)[:3]
+    if magic != b"P5":
+        raise ValueError(f"not a PGM file: {path}")
+    return int(width), int(height)
+
+
+def _render_to_file(file_path: str, page: int, dpi: int, folder: str) -> str:
+    return convert_from_path(file_path, dpi=dpi, first_page=page, last_page=page, grayscale=True,
+                             output_folder=folder, paths_only=True)[0]
+
+
+def render_page(file_path: str, page: int, dpi: int = OCR_DPI, max_pixels: Optional[int] = None):
+    """
+    Render one page straight to 8-bit greyscale (OCR never needs the colour
+    page). Poppler writes it to a temp file whose header is checked before the
+    pixels are loaded; a page larger than `max_pixels` (page_pixel_budget() for
+    a single page by default) is re-rendered at a lower dpi. The ceiling is
+    applied here only; PIL's own limit for the rest of the process is left
+    alone, other than never rendering past it.
+    """
+    if max_pixels is None:
+        max_pixels = page_pixel_budget()
+    if Image.MAX_IMAGE_PIXELS:
+        max_pixels = min(max_pixels, Image.MAX_IMAGE_PIXELS)
+    try:
+        with tempfile.TemporaryDirectory(prefix="bbkm_render_") as tmp:
+            path = _render_to_file(file_path, page, dpi, tmp)
+            width, height = _pgm_size(path)
+            if width * height > max_pixels:
+                scaled_dpi = max(1, int(dpi * (max_pixels / (width * height)) ** 0.5))
+                print(f"Page {page} of {file_path} is {width}x{height} at {dpi} dpi, "
+                      f"over the memory ceiling; rendering at {scaled_dpi} dpi")
+                os.remove(path)
+                path = _render_to_file(file_path, page, scaled_dpi, tmp)
+            image = Image.open(path)
+            image.load()
+            return image
+    except Exception as e:
+        raise PdfRenderError(f"{file_path} page {page}: {e}") from e
+
+
+def iter_pages(file_path: str, pages, dpi: int = OCR_DPI, max_pixels: Optional[int] = None):
+    """
+    Yield (page, image) one page at a time. Each image is closed once the
+    consumer moves on, so only one rendered page is held however long the PDF.
+    """
+    for page in pages:
+        image = render_page(file_path, page, dpi, max_pixels)
+        try:
+            yield page, image
+        finally:
+            image.close()
+
+
+def words_to_page(rows) -> PageText:
+    """
+    Rebuild page text from Tesseract word rows (Word tuples plus their
+    (block, paragraph, line) keys): words joined by spaces, lines by newlines,
+    blocks by a blank line, ending in a form feed like image_to_string.
+    """
+    lines, confidences, last = [], [], None
+    for key, word in rows:
+        if key != last:
+            if last is not None and key[0] != last[0]:
+                lines.append("")
+            lines.append([])
+            last = key
+        lines[-1].append(word.text)
+        confidences.append(word.confidence)
+    text = "\n".join(" ".join(line) if line != "" else "" for line in lines)
+    confidence = sum(confidences) / len(confidences) if confidences else None
+    return PageText(text + "\n\f" if text else "\f", confidence)
+
+
+def image_words(image):
+    """[((block, paragraph, line), Word)] for every recognised word on the image."""
+    data = image_to_data(image, output_type=Output.DICT)
+    rows = []
+    for i, text in enumerate(data["text"]):
+        confidence = float(data["conf"][i])
+        if confidence < 0 or not text.strip():
+            continue
+        word = Word(text, confidence, data["left"][i], data["top"][i], data["width"][i], data["height"][i])
+        rows.append(((data["block_num"][i], data["par_num"][i], data["line_num"][i]), word))
+    return rows
+
+
+def ocr_image(image) -> PageText:
+    if OCR_WORD_DATA:
+        return words_to_page(image_words(image))
+    return PageText(image_to_string(image), None)
+
+
+def ocr_page_job(job: PageJob) -> PageText:
+    page = render_page(job.file_path, job.page, job.dpi, job.max_pixels)
+    try:
+        image = preprocess_image(page, job.profile)
+    finally:
+        page.close()
+    try:
+        return ocr_image(image)
+    finally:
+        image.close()
+
+
+def _parse_tsv(tsv: str, pages: int) -> list:
+    # Columns: level page_num block_num par_num line_num word_num left top width height conf text
+    rows = [[] for _ in range(pages)]
+    for line in tsv.splitlines()[1:]:
+        cols = line.split("\t", 11)
+        if len(cols) < 12 or not cols[11].strip() or float(cols[10]) < 0:
+            continue
+        page = int(cols[1]) - 1
+        if not 0 <= page < pages:
+            raise RuntimeError(f"tesseract batch returned page {page + 1} for {pages} images")
+        word = Word(cols[11], float(cols[10]), int(cols[6]), int(cols[7]), int(cols[8]), int(cols[9]))
+        rows[page].append(((int(cols[2]), int(cols[3]), int(cols[4])), word))
+    return [words_to_page(page_rows) for page_rows in rows]
+
+
+def tesseract_batch(images) -> list:
+    """
+    OCR several images with one tesseract process: the images are written to
+    a temp folder, listed in a text file and read as one multi-page input.
+    With OCR_WORD_DATA the TSV output is split on its page_num column;
+    otherwise the text output is split on the form feed Tesseract ends every
+    page with (each page keeping its form feed, as image_to_string does).
+    """
+    with tempfile.TemporaryDirectory(prefix="bbkm_ocr_") as tmp:
+        paths = []
+        for i, image in enumerate(images):
+            path = os.path.join(tmp, f"page{i}.png")
+            image.save(path)
+            paths.append(path)
+        list_file = os.path.join(tmp, "pages.txt")
+        with open(list_file, "w") as f:
+            f.write("\n".join(paths) + "\n")
+
+        out_base = os.path.join(tmp, "out")
+        extension = "tsv" if OCR_WORD_DATA else "txt"
+        command = [pytesseract.tesseract_cmd, list_file, out_base] + (["tsv"] if OCR_WORD_DATA else [])
+        # subprocess_args hides the console window on Windows, as pytesseract's own calls do
+        proc = subprocess.run(command, **subprocess_args(include_stdout=False))
+        if proc.returncode != 0:
+            raise RuntimeError(f"tesseract batch failed: {proc.stderr.decode(errors='replace').strip()}")
+        with open(f"{out_base}.{extension}", encoding="utf-8") as f:
+            output = f.read()
+
+    if OCR_WORD_DATA:
+        return _parse_tsv(output, len(paths))
+    pages = output.split("\f")
+    if len(pages) != len(paths) + 1:
+        raise RuntimeError(f"tesseract batch returned {len(pages) - 1} pages for {len(paths)} images")
+    return [PageText(page + "\f", None) for page in pages[:-1]]
+
+
+def ocr_batch_job(jobs) -> list:
+    """OCR a run of PageJobs, in one tesseract process when the batch backend is on."""
+    if OCR_BACKEND != "batch" or len(jobs) == 1:
+        return [ocr_page_job(job) for job in jobs]
+
+    images = []
+    try:
+        first = jobs[0]
+        # Only the preprocessed copies are kept; batch_jobs guarantees one document, dpi and profile
+        for _, page in iter_pages(first.file_path, [job.page for job in jobs], first.dpi, first.max_pixels):
+            images.append(preprocess_image(page, first.profile))
+        try:
+            return tesseract_batch(images)
+        except (OSError, RuntimeError) as e:
+            print(f"Batch OCR failed, reading pages one at a time: {e}")
+            return [ocr_image(image) for image in images]
+    finally:
+        for image in images:
+            image.close()
+
+
+def _pool_batch_job(jobs):
+    # Preprocessing counters live in the worker; hand them back with the texts
+    return ocr_batch_job(jobs), take_profile_stats()
+
+
+def batch_jobs(jobs, size: int):
+    """Group consecutive PageJobs of the same document, dpi and profile into lists of up to `size`."""
+    batch, key = [], None
+    for job in jobs:
+        job_key = (job.file_path, job.dpi, job.profile)
+        if batch and (len(batch) >= size or job_key != key):
+            yield batch
+            batch = []
+        batch.append(job)
+        key = job_key
+    if batch:
+        yield batch
+
+
+def ocr_region_job(job: RegionJob):
+    """[(region name, text)] for each region of one rendered page (plain text, no confidences)."""
+    image = render_page(job.file_path, job.page, job.dpi)
+    try:
+        width, height = image.size
+        texts = []
+        for name, (left, top, right, bottom) in job.regions:
+            crop = image.crop((int(left * width), int(top * height), int(right * width), int(bottom * height)))
+            texts.append((name, image_to_string(preprocess_image(crop, job.profile))))
+            crop.close()
+        return texts
+    finally:
+        image.close()
+
+
+def _init_worker(omp_thread_limit):
+    # Inherited by every tesseract.exe this worker starts
+    os.environ["OMP_THREAD_LIMIT"] = omp_thread_limit
+
+
+class OcrPool:
+    """
+    Process pool for page-level OCR jobs. `map_pages` keeps at most one job
+    (one batch with the batch backend) per worker in flight, and no more pages
+    than max_pages_in_flight(), and yields texts in job order, so a caller that stops early (a match on page 1) only wastes the
+    pages already running.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, omp_thread_limit: str = OCR_OMP_THREAD_LIMIT):
+        self.workers = max(1, workers)
+        self.omp_thread_limit = omp_thread_limit
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                                 initargs=(self.omp_thread_limit,))
+        return self._executor
+
+    def _limits(self):
+        """(pages per batch, batches in flight) for one document, kept within max_pages_in_flight()."""
+        page_limit = max_pages_in_flight()
+        size = min(max(1, OCR_BATCH_PAGES) if OCR_BACKEND == "batch" else 1, page_limit)
+        return size, max(1, min(self.workers, page_limit // size))
+
+    def pages_in_flight(self) -> int:
+        """Most pages of one document rendered at once."""
+        size, slots = self._limits()
+        return size * slots
+
+    def map_pages(self, jobs):
+        size, slots = self._limits()
+        batches = batch_jobs(jobs, size)
+        if self.workers == 1:
+            for batch in batches:
+                yield from ocr_batch_job(batch)
+            return
+
+        executor = self._get_executor()
+        pending = deque(executor.submit(_pool_batch_job, batch) for batch in islice(batches, slots))
+        try:
+            while pending:
+                try:
+                    texts, profile_stats = pending.popleft().result()
+                except BrokenProcessPool:
+                    # A worker died (e.g. tesseract crashed hard); start a fresh pool next time
+                    self.shutdown()
+                    raise
+                batch = next(batches, None)
+                if batch is not None:
+                    pending.append(executor.submit(_pool_batch_job, batch))
+                merge_profile_stats(profile_stats)
+                yield from texts
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pool = None
+
+
+def get_pool() -> OcrPool:
+    global _pool
+    if _pool is None:
+        _pool = OcrPool()
+        atexit.register(_pool.shutdown)
+    return _pool
+
+
+_text_cache = None
+
+
+def get_text_cache() -> Optional[OcrTextCache]:
+    global _text_cache, OCR_CACHE_ENABLED
+    if _text_cache is None and OCR_CACHE_ENABLED:
+        try:
+            _text_cache = OcrTextCache()
+            atexit.register(_text_cache.close)
+        except sqlite3.Error as e:
+            print(f"OCR text cache unavailable, OCR results will not be cached: {e}")
+            OCR_CACHE_ENABLED = False
+    return _text_cache
+
+
+def document_hash(file_path: str) -> Optional[str]:
+    """Cache key for a PDF, or None when caching is off or the file can't be read."""
+    if get_text_cache() is None:
+        return None
+    try:
+        return file_sha256(file_path)
+    except OSError as e:
+        print(f"Error hashing {file_path}: {e}")
+        return None
+
+
+def _cached_texts(file_hash, pages, dpi, profile, region=FULL_PAGE) -> dict:
+    cache = get_text_cache()
+    if cache is None or file_hash is None:
+        return {}
+    try:
+        return {page: PageText(*row) for page, row in cache.get_pages(file_hash, pages, dpi, profile, region).items()}
+    except sqlite3.Error as e:
+        print(f"OCR cache read failed: {e}")
+        return {}
+
+
+def _cache_text(file_hash, page, dpi, profile, text, region=FULL_PAGE, confidence=None):
+    cache = get_text_cache()
+    if cache is None or file_hash is None:
+        return
+    try:
+        cache.put(file_hash, page, dpi, profile, text, region, confidence)
+    except sqlite3.Error as e:
+        print(f"OCR cache write failed: {e}")
+
+
+def cache_summary() -> str:
+    cache = get_text_cache()
+    return cache.summary() if cache is not None else "OCR cache: disabled"
+
+
+def ocr_pdf_pages(file_path: str, dpi: int, profile: str, pages=None, file_hash=None,
+                  max_new_pages: Optional[int] = None, reuse_profiles=()):
+    """
+    Yield a PageText for each page (all pages by default) in page order.
+    Pages already in the OCR cache for `file_hash` are not rendered again;
+    that includes pages cached at the same dpi under one of `reuse_profiles`
+    (another stage's read of the page), while new reads use `profile`.
+    With `max_new_pages`, at most that many uncached pages are OCR'd and the
+    generator stops before the first page past the limit.
+    """
+    if pages is None:
+        pages = range(1, page_count(file_path) + 1)
+    pages = list(pages)
+    if file_hash is None:
+        file_hash = document_hash(file_path)
+    cached = _cached_texts(file_hash, pages, dpi, profile)
+    for other in reuse_profiles:
+        remaining = [page for page in pages if page not in cached]
+        if not remaining:
+            break
+        cached.update(_cached_texts(file_hash, remaining, dpi, other))
+    missing = [page for page in pages if page not in cached]
+    if max_new_pages is not None:
+        missing = missing[:max_new_pages]
+    pool = get_pool()
+    # A short document never has more pages in flight than it has pages to read
+    max_pixels = page_pixel_budget(min(len(missing), pool.pages_in_flight()))
+    texts = pool.map_pages(PageJob(file_path, page, dpi, profile, max_pixels) for page in missing)
+    try:
+        for page in pages:
+            if page in cached:
+                yield cached[page]
+                continue
+            if page not in missing:
+                return
+            result = next(texts)
+            _cache_text(file_hash, page, dpi, profile, result.text, confidence=result.confidence)
+            yield result
+    finally:
+        texts.close()
+
+
+def stream_ocr(file_path: str, match_fn: Optional[Callable[[str], Any]] = None,
+               dpi: int = OCR_DPI, profile: str = "contrast", known_texts=None,
+               file_hash: Optional[str] = None, stage: str = "client",
+               max_new_pages: Optional[int] = None) -> OcrResult:
+    """
+    OCR a document page by page (pages run in parallel on the pool). After each
+    page `match_fn` is called with the document text so far, in page order; as
+    soon as it returns something other than None the remaining pages are
+    skipped. Without `match_fn` every page is read.
+
+    `known_texts` maps page numbers to text that is already available (a usable
+    PDF text layer). Those pages are not OCR'd but are part of the text. The
+    stats carry the mean confidence of the pages that were OCR'd, and the
+    error if rendering or OCR failed (the text is then partial).
+
+    Only the pages in the stage's STAGE_PAGE_BUDGETS entry are read. With
+    `max_new_pages` a long document may stop early without a match; the pages
+    not reached are counted in `stats.pages_deferred`.
+    """
+    stats = OcrStats(file_path, dpi)
+    start = time.perf_counter()
+    texts = dict(known_texts or {})
+    stats.pages_text_layer = len(texts)
+    confidences = []
+    match = None
+    try:
+        stats.pages_total = page_count(file_path)
+        pages = [page for page in stage_pages(file_path, stage) if page not in texts]
+        page_texts = ocr_pdf_pages(file_path, dpi, profile, pages, file_hash, max_new_pages)
+        try:
+            for page, page_text in zip(pages, page_texts):
+                texts[page] = page_text.text
+                if page_text.confidence is not None:
+                    confidences.append(page_text.confidence)
+                stats.pages_processed += 1
+
+                if match_fn is not None:
+                    match = match_fn(_join_pages(texts))
+                    if match is not None:
+                        stats.matched_page = page
+                        break
+        finally:
+            # Cancels pages still queued on the pool
+            page_texts.close()
+        if match is None:
+            stats.pages_deferred = len(pages) - stats.pages_processed
+    except Exception as e:
+        print(f"Error extracting text with OCR: {e}")
+        stats.error = str(e) or type(e).__name__
+    if confidences:
+        stats.confidence = sum(confidences) / len(confidences)
+    stats.seconds = time.perf_counter() - start
+    return OcrResult(_join_pages(texts), match, stats)
+
+
+def _join_pages(texts) -> str:
+    return "".join(texts[page] for page in sorted(texts))
+
+
+def should_escalate(confidence: Optional[float]) -> bool:
+    """Whether an unmatched read is worth another, more expensive pass."""
+    return confidence is None or confidence < OCR_ESCALATE_CONFIDENCE
+
+
+def needs_review(confidence: Optional[float]) -> bool:
+    """Too unreadable to trust any automatic (including fuzzy) match; meant for the last tier's read."""
+    return confidence is not None and confidence < OCR_REVIEW_CONFIDENCE
+
+
+def run_tiers(stage: str, tiers, attempt, confidence_of=None):
+    """
+    Call `attempt(dpi)` for each resolution tier in turn until it reports a
+    match. `attempt` returns (result, matched), with matched None when the
+    document was only partly read and continues next sweep. Returns (result,
+    dpi) for the tier that resolved the document, or the last result and None.
+    Every document is counted in TIER_STATS under the tier that resolved it.
+
+    With `confidence_of(result)`, an unmatched tier only escalates to the next
+    one when `should_escalate` says the read was doubtful, and an unresolved
+    document whose last read `needs_review` is counted as "unreadable".
+    """
+    result = None
+    for i, dpi in enumerate(tiers):
+        result, matched = attempt(dpi)
+        if matched:
+            TIER_STATS[stage, dpi] += 1
+            return result, dpi
+        if matched is None:
+            TIER_STATS[stage, "deferred"] += 1
+            return result, None
+        if confidence_of is not None and i < len(tiers) - 1 and not should_escalate(confidence_of(result)):
+            TIER_STATS[stage, "clean"] += 1
+            break
+    TIER_STATS[stage, None] += 1
+    if confidence_of is not None and needs_review(confidence_of(result)):
+        TIER_STATS[stage, "unreadable"] += 1
+    return result, None
+
+
+def region_first_ocr(file_path: str, match_fn: Callable[[str], Any], dpi: int, profile: str,
+                     stage: str, regions=None, page: int = 1, file_hash: Optional[str] = None):
+    """
+    OCR the configured regions of one page (page 1 by default) and run
+    `match_fn` on each region's text. Returns (region name, text, match) for
+    the first region that matches, or None so the caller falls back to
+    full-page OCR. Hits are counted per region in REGION_STATS.
+    """
+    regions = OCR_REGIONS if regions is None else regions
+    if not regions:
+        return None
+    REGION_STATS[stage, "documents"] += 1
+
+    cached = {name: _cached_texts(file_hash, [page], dpi, profile, name).get(page) for name, _ in regions}
+    if all(hit is not None for hit in cached.values()):
+        texts = [(name, cached[name].text) for name, _ in regions]
+    else:
+        texts = ocr_region_job(RegionJob(file_path, page, dpi, profile, tuple(regions)))
+        for name, text in texts:
+            _cache_text(file_hash, page, dpi, profile, text, name)
+
+    for name, text in texts:
+        match = match_fn(text)
+        if match is not None:
+            REGION_STATS[stage, name] += 1
+            return name, text, match
+    return None
+
+
+def tiered_ocr(file_path: str, match_fn: Callable[[str], Any], tiers=CLIENT_DPI_TIERS,
+               profile: str = "contrast", stage: str = "client", known_texts=None,
+               file_hash: Optional[str] = None, chunk_pages: Optional[int] = OCR_CHUNK_PAGES) -> OcrResult:
+    """
+    At each tier in `tiers`: the page-1 regions first, then `stream_ocr` over
+    the full pages, until `match_fn` finds something. Moving up a tier also
+    needs the full-page read to have been doubtful (see should_escalate).
+    Pages in `known_texts` already have a usable text layer and are never OCR'd.
+    At most `chunk_pages` uncached pages are read per call; a longer
+    document comes back with `stats.pages_deferred` set and no match.
+    chunk_pages=None reads the whole document now, and so does any call made
+    while the OCR cache is off: the next sweep couldn't pick up the pages read.
+    """
+    known_texts = known_texts or {}
+    if file_hash is None:
+        file_hash = document_hash(file_path)
+
+    def attempt(dpi):
+        start = time.perf_counter()
+        hit = None
+        if 1 not in known_texts:
+            try:
+                hit = region_first_ocr(file_path, match_fn, dpi, profile, stage, file_hash=file_hash)
+            except Exception as e:
+                print(f"Error extracting text with region OCR: {e}")
+        if hit is not None:
+            region, text, match = hit
+            stats = OcrStats(file_path, dpi, matched_page=1, region=region,
+                             seconds=time.perf_counter() - start)
+            return OcrResult(text, match, stats), True
+
+        # Chunking relies on the OCR cache to pick up where the last sweep stopped
+        chunk = chunk_pages if get_text_cache() is not None and file_hash is not None else None
+        result = stream_ocr(file_path, match_fn, dpi, profile, known_texts, file_hash, stage, chunk)
+        # Include the region pass that missed
+        result.stats.seconds = time.perf_counter() - start
+        if result.stats.pages_deferred:
+            return result, None
+        return result, result.match is not None
+
+    result, _ = run_tiers(stage, tiers, attempt, lambda result: result.stats.confidence)
+    return result
+
+
+def tier_summary(stage: str) -> str:
+    counts = {dpi: n for (s, dpi), n in TIER_STATS.items() if s == stage}
+    resolved = ", ".join(f"{dpi} dpi: {counts[dpi]}" for dpi in sorted(d for d in counts if isinstance(d, int)))
+    return (f"OCR tiers ({stage}): {resolved or 'none resolved'}, unresolved: {counts.get(None, 0)} "
+            f"(not escalated as clean: {counts.get('clean', 0)}, unreadable at the last tier: "
+            f"{counts.get('unreadable', 0)}), "
+            f"deferred: {counts.get('deferred', 0)}")
+
+
+def region_summary(stage: str) -> str:
+    documents = REGION_STATS[stage, "documents"]
+    hits = ", ".join(f"{name} {REGION_STATS[stage, name]}/{documents}" for name, _ in OCR_REGIONS)
+    return f"OCR regions ({stage}): {hits}"
@@ -0,0 +1,62 @@
+import os
+import subprocess
+
+from PyPDF2 import PdfReader
+from pytesseract.pytesseract import subprocess_args
+
+# Text-layer extractor used before falling back to OCR:
+#   "pypdf2"    - pure Python, always available (default)
+#   "pdftotext" - poppler's pdftotext, already installed alongside pdftoppm for OCR rendering
+#   "pymupdf"   - PyMuPDF, if the package is installed
+PDF_TEXT_BACKEND = os.getenv("BBKM_PDF_TEXT_BACKEND", "pypdf2").strip().lower()
+
+# A page's text layer is used instead of OCR when it has at least this many
+# characters and this share of them is ordinary text
+MIN_TEXT_LAYER_CHARS = 25
+MIN_TEXT_LAYER_READABLE = 0.9
+
+
+def has_text_layer(text):
+    # Scanned pages often carry an empty or junk text layer (stray glyphs from a scanner's OCR font)
+    stripped = text.strip()
+    if len(stripped) < MIN_TEXT_LAYER_CHARS:
+        return False
+    readable = sum(ch.isalnum() or ch.isspace() or ch in ".,:;-/$&()'#" for ch in stripped)
+    return readable / len(stripped) >= MIN_TEXT_LAYER_READABLE
+
+
+def pypdf2_page_texts(file_path):
+    with open(file_path, 'rb') as f:
+        reader = PdfReader(f)
+        # extract_text() returns None for some pages (no content stream, odd fonts)
+        return [page.extract_text() or '' for page in reader.pages]
+
+
+def pdftotext_page_texts(file_path):
+    # pdftotext ends every page with a form feed; "-" writes to stdout.
+    # subprocess_args hides the console window on Windows, as pytesseract's own calls do.
+    proc = subprocess.run(["pdftotext", "-q", "-enc", "UTF-8", file_path, "-"], **subprocess_args())
+    if proc.returncode != 0:
+        raise RuntimeError(f"pdftotext exited with {proc.returncode}: {proc.stderr.decode(errors='replace').strip()}")
+    return proc.stdout.decode("utf-8", errors="replace").split("\f")[:-1]
+
+
+def pymupdf_page_texts(file_path):
+    import fitz
+    with fitz.open(file_path) as doc:
+        return [page.get_text() for page in doc]
+
+
+PDF_TEXT_BACKENDS = {
+    "pypdf2": pypdf2_page_texts,
+    "pdftotext": pdftotext_page_texts,
+    "pymupdf": pymupdf_page_texts,
+}
+
+
+def get_backend(backend=None):
+    backend = backend or PDF_TEXT_BACKEND
+    try:
+        return PDF_TEXT_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown PDF text backend '{backend}'. Expected one of: {', '.join(PDF_TEXT_BACKENDS)}")
@@ -0,0 +1,91 @@
+from collections import Counter
+
+from pdf2image import pdfinfo_from_path
+from PyPDF2 import PasswordType, PdfReader
+
+# Triage classes
+CORRUPT = "corrupt"          # can't be parsed at all
+ENCRYPTED = "encrypted"      # needs a password to open
+EMPTY = "empty"              # no pages, or pages with nothing drawn on them
+TEXT_LAYER = "text layer"    # at least one page uses fonts
+IMAGE_ONLY = "image only"    # scans: pages are images, OCR is the only way in
+
+# Files seen per class since start-up
+TRIAGE_STATS = Counter()
+
+# How deep to follow form XObjects that wrap a page's real content
+_MAX_FORM_DEPTH = 3
+
+
+def _resource_kinds(resources, depth=0):
+    """(has fonts, has images) for a /Resources dictionary, looking inside form XObjects."""
+    if resources is None:
+        return False, False
+    resources = resources.get_object()
+    fonts = bool(resources.get("/Font"))
+    images = False
+    xobjects = resources.get("/XObject")
+    if xobjects:
+        for ref in xobjects.get_object().values():
+            xobject = ref.get_object()
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image":
+                images = True
+            elif subtype == "/Form" and depth < _MAX_FORM_DEPTH:
+                form_fonts, form_images = _resource_kinds(xobject.get("/Resources"), depth + 1)
+                fonts, images = fonts or form_fonts, images or form_images
+            if fonts and images:
+                break
+    return fonts, images
+
+
+def _has_content(page) -> bool:
+    contents = page.get_contents()
+    return contents is not None and bool(contents.get_data().strip())
+
+
+def classify_pdf(file_path: str) -> str:
+    """
+    Classify a PDF from its structure alone (no page is rendered or OCR'd).
+    Only a page that lists neither fonts nor images has its content stream
+    read, to tell a blank page from inline images or vector drawings.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            reader = PdfReader(f)
+            if reader.is_encrypted:
+                # Owner-password-only PDFs open with an empty user password. If
+                # PyPDF2 can't even try (AES-256 without PyCryptodome raises),
+                # the pdfinfo check below decides instead.
+                if reader.decrypt("") == PasswordType.NOT_DECRYPTED:
+                    return ENCRYPTED
+
+            pages = reader.pages
+            if len(pages) == 0:
+                return EMPTY
+            drawn = False
+            for page in pages:
+                fonts, images = _resource_kinds(page.get("/Resources"))
+                if fonts:
+                    return TEXT_LAYER
+                drawn = drawn or images or _has_content(page)
+            return IMAGE_ONLY if drawn else EMPTY
+    except Exception:
+        pass
+
+    # PyPDF2 is stricter than poppler; a file poppler can still read goes to OCR
+    try:
+        pdfinfo_from_path(file_path)
+        return IMAGE_ONLY
+    except Exception:
+        return CORRUPT
+
+
+def triage_pdf(file_path: str) -> str:
+    kind = classify_pdf(file_path)
+    TRIAGE_STATS[kind] += 1
+    return kind
+
+
+def triage_summary() -> str:
+    return "PDF triage: " + (", ".join(f"{kind} {n}" for kind, n in TRIAGE_STATS.most_common()) or "nothing triaged")
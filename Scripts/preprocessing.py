@@ -0,0 +1,132 @@
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+from PIL import Image
+
+# Contrast factor used for client-name OCR (was ImageEnhance.Contrast(1.5) on the RGB page)
+CONTRAST_FACTOR = 1.5
+
+# Per-profile counters: pages, megapixels, seconds and the largest peak of
+# traced allocations seen (only while tracemalloc is running, e.g. in benchmarks)
+PROFILE_STATS = defaultdict(lambda: {"pages": 0, "megapixels": 0.0, "seconds": 0.0, "peak_bytes": 0})
+
+
+def _apply_lut(gray: np.ndarray, lut: np.ndarray) -> np.ndarray:
+    # Plain indexing keeps uint8 indices; np.take would widen them to intp (8 bytes a pixel)
+    return lut[gray]
+
+
+def contrast_lut(gray: np.ndarray, factor: float = CONTRAST_FACTOR) -> np.ndarray:
+    # Same arithmetic as ImageEnhance.Contrast: blend towards the rounded mean grey level
+    mean = int(gray.mean() + 0.5)
+    values = mean + factor * (np.arange(256, dtype=np.float32) - mean)
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+def autocontrast_lut(lo: int, hi: int) -> np.ndarray:
+    # Same mapping as ImageOps.autocontrast with no cutoff
+    if hi <= lo:
+        return np.arange(256, dtype=np.uint8)
+    scale = 255.0 / (hi - lo)
+    values = np.arange(256, dtype=np.float64) * scale - lo * scale
+    return np.clip(values, 0, 255).astype(np.uint8)
+
+
+def _sort_pair(a: np.ndarray, b: np.ndarray):
+    low = np.minimum(a, b)
+    np.maximum(a, b, out=b)
+    return low, b
+
+
+def median3(gray: np.ndarray) -> np.ndarray:
+    """
+    3x3 median with replicated edges, as ImageFilter.MedianFilter(3). Uses the
+    19 min/max exchange network for the median of nine, so working memory is a
+    handful of uint8 page-sized arrays rather than a 9-deep float stack.
+    """
+    padded = np.pad(gray, 1, mode="edge")
+    h, w = gray.shape
+    p = [padded[dy:dy + h, dx:dx + w].copy() for dy in range(3) for dx in range(3)]
+    del padded
+    for i, j in ((1, 2), (4, 5), (7, 8), (0, 1), (3, 4), (6, 7), (1, 2), (4, 5), (7, 8), (0, 3),
+                 (5, 8), (4, 7), (3, 6), (1, 4), (2, 5), (4, 7), (4, 2), (6, 4), (4, 2)):
+        p[i], p[j] = _sort_pair(p[i], p[j])
+    return p[4]
+
+
+def profile_none(gray: np.ndarray) -> np.ndarray:
+    return gray
+
+
+def profile_contrast(gray: np.ndarray) -> np.ndarray:
+    return _apply_lut(gray, contrast_lut(gray))
+
+
+def profile_invert(gray: np.ndarray) -> np.ndarray:
+    # invert -> median -> autocontrast. The median commutes with inversion, so
+    # filter first and fold inversion and autocontrast into one lookup table.
+    filtered = median3(gray)
+    lo, hi = 255 - int(filtered.max()), 255 - int(filtered.min())
+    lut = autocontrast_lut(lo, hi)[255 - np.arange(256)]
+    return _apply_lut(filtered, lut)
+
+
+# Named so page jobs can be sent to worker processes
+PROFILES = {
+    "none": profile_none,
+    "contrast": profile_contrast,   # client-name OCR
+    "invert": profile_invert,       # vendor/category OCR
+}
+
+
+def preprocess(gray: np.ndarray, profile: str) -> np.ndarray:
+    """Run a named profile on a 2-D uint8 greyscale array, recording its cost."""
+    stats = PROFILE_STATS[profile]
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    out = PROFILES[profile](gray)
+    stats["seconds"] += time.perf_counter() - start
+    stats["pages"] += 1
+    stats["megapixels"] += gray.size / 1e6
+    if tracing:
+        _, peak = tracemalloc.get_traced_memory()
+        stats["peak_bytes"] = max(stats["peak_bytes"], peak - base)
+    return out
+
+
+def preprocess_image(image: Image.Image, profile: str) -> Image.Image:
+    """Greyscale PIL image in, preprocessed greyscale PIL image out."""
+    if image.mode != "L":
+        image = image.convert("L")
+    return Image.fromarray(preprocess(np.asarray(image), profile))
+
+
+def take_profile_stats() -> dict:
+    """Return and reset this process's counters (pool workers send them back with their results)."""
+    stats = {profile: dict(values) for profile, values in PROFILE_STATS.items()}
+    PROFILE_STATS.clear()
+    return stats
+
+
+def merge_profile_stats(stats: dict):
+    for profile, values in stats.items():
+        totals = PROFILE_STATS[profile]
+        for key in ("pages", "megapixels", "seconds"):
+            totals[key] += values[key]
+        totals["peak_bytes"] = max(totals["peak_bytes"], values["peak_bytes"])
+
+
+def profile_summary() -> str:
+    parts = []
+    for profile, stats in sorted(PROFILE_STATS.items()):
+        if not stats["pages"]:
+            continue
+        rate = stats["megapixels"] / stats["seconds"] if stats["seconds"] else 0.0
+        peak = f", peak {stats['peak_bytes'] / 2**20:.0f} MiB" if stats["peak_bytes"] else ""
+        parts.append(f"{profile} {stats['pages']} pages {stats['seconds']:.2f}s ({rate:.0f} MP/s{peak})")
+    return "Preprocessing: " + ("; ".join(parts) or "nothing run")
@@ -3,20 +3,22 @@ import re
 import pandas as pd
 import shutil
 import tempfile
-import time
-import sys
-import spacy
-from PyPDF2 import PdfReader
-from pdf2image import convert_from_path
-from pytesseract import image_to_string, pytesseract
-from PIL import Image, ImageEnhance
 import win32com.client
-
-pytesseract.tesseract_cmd = r"C:\BBKM_InvoiceSorter\Library\Tesseract-OCR\tesseract.exe"
+import ocr_engine
+from client_cache import ClientTableCache
+from client_matcher import ClientMatcher
+from match_cache import MatchCache, file_sha256
+from pdf_text import PDF_TEXT_BACKEND, get_backend, has_text_layer
+from pdf_triage import CORRUPT, EMPTY, ENCRYPTED, TEXT_LAYER, triage_pdf, triage_summary
+from preprocessing import profile_summary
+from tokenized_text import TokenizedText, get_tokenizer
 
 # Enable verbose logging
 VERBOSE_LOGGING = True
 
+# OCR-error tolerant matches at or above this confidence are renamed automatically;
+# anything lower still goes to Failed for manual coding
+FUZZY_AUTO_RENAME_CONFIDENCE = 0.9
 def verbose_log(message):
     if VERBOSE_LOGGING:
         print(message)
@@ -25,66 +27,14 @@ def clean_name(name):
     cleaned = re.sub(r'[^\w\s]', '', name).strip()
     return re.sub(r'[-\']', ' ', cleaned)
 
-nlp = spacy.load("en_core_web_sm")
-
-def find_name_match(name, text, proximity=5):
-    # Clean and prepare the name and text
-    name = re.sub(r'[^\w\s]', '', name).strip().replace(':', '').replace('NDIS', '')
-    text = re.sub(r'[^\w\s]', '', text).strip().replace(':', '').replace('NDIS', '')
-
-    # Handle the case where the first and last name are connected by a comma with no space
-    text = text.replace(',', '')
-
-    # Split the name into parts, ignoring titles
-    name_parts = [part.lower() for part in name.split() if part.lower() not in ['mr', 'mrs', 'miss', 'master', 'NDIS']]
-    
-    # Generate the reversed name (last name first)
-    reversed_name_parts = name_parts[::-1]
-
-    doc = nlp(text)
-    text_parts = [token.text.lower() for token in doc]
-
-    # Check for an exact match first
-    exact_match_pattern = r'\b' + ' '.join(name_parts) + r'\b'
-    reversed_match_pattern = r'\b' + ' '.join(reversed_name_parts) + r'\b'
-
-    if re.search(exact_match_pattern, text, re.IGNORECASE):
-        return True
-
-    if re.search(reversed_match_pattern, text, re.IGNORECASE):
-        return True
-
-    # Check if the name is in "Lastname, Firstname" format
-    if len(reversed_name_parts) >= 2:  # Ensure there are at least two elements in reversed_name_parts
-        lastname_firstname_pattern = r'\b' + reversed_name_parts[0] + r', ' + reversed_name_parts[1] + r'\b'
-        if re.search(lastname_firstname_pattern, text, re.IGNORECASE):
-            return True
-
-    # Check for the "FirstnameLastnameNumbers" format
-    if len(name_parts) >= 2:  # Ensure there are at least two elements in name_parts
-        firstname_lastname_numbers_pattern = r'\b' + name_parts[0] + name_parts[1] + r'\d*\b'
-        if re.search(firstname_lastname_numbers_pattern, text, re.IGNORECASE):
-            return True
-
-    # Check if the name parts are close together (both normal and reversed)
-    for i in range(len(text_parts)):
-        if len(name_parts) > 0 and name_parts[0] == text_parts[i]:  # Ensure name_parts is not empty
-            for j in range(1, len(name_parts)):
-                if i + j < len(text_parts) and name_parts[j] == text_parts[i + j]:
-                    if j <= proximity:
-                        return True
-                    else:
-                        break
-
-        if len(reversed_name_parts) > 0 and reversed_name_parts[0] == text_parts[i]:  # Ensure reversed_name_parts is not empty
-            for j in range(1, len(reversed_name_parts)):
-                if i + j < len(text_parts) and reversed_name_parts[j] == text_parts[i + j]:
-                    if j <= proximity:
-                        return True
-                    else:
-                        break
-
-    return False
+# Regex tokenizer by default; spaCy only loads on first use if BBKM_TOKENIZER_BACKEND=spacy
+tokenize = get_tokenizer()
+
+def tokenize_document(text):
+    # Clean and tokenise an extraction result once; every name check reuses it
+    if isinstance(text, TokenizedText):
+        return text
+    return TokenizedText(text, tokenize)
 
 def move_email(email, subfolder_name, filename):
     try:
@@ -118,15 +68,31 @@ def move_email(email, subfolder_name, filename):
 def get_subfolder(code, subfolder_paths):
     return subfolder_paths
 
-def find_name_code_match(text, excel_data):
-    for i in range(len(excel_data)):
-        name = str(excel_data.iloc[i, 0])
-        code = excel_data.iloc[i, 1]
+def build_client_matcher(excel_data):
+    return ClientMatcher.from_dataframe(excel_data, tokenize)
+
+def find_name_code_match(text, client_matcher):
+    # Accept a raw client table for older callers; build the index once per call
+    if not isinstance(client_matcher, ClientMatcher):
+        client_matcher = build_client_matcher(client_matcher)
+    return client_matcher.find_code(text)
 
-        if find_name_match(name, text):
-            return True, code
+def find_fuzzy_code_match(text, client_matcher):
+    matches = client_matcher.find_fuzzy(text)
+    if not matches or matches[0].confidence < FUZZY_AUTO_RENAME_CONFIDENCE:
+        return False, None
 
-    return False, None
+    best = matches[0]
+    # Two different clients equally likely: leave it for manual coding
+    for other in matches[1:]:
+        if other.confidence < best.confidence:
+            break
+        if other.code != best.code:
+            verbose_log(f"Ambiguous fuzzy match {best.code}/{other.code} ({best.confidence:.2f})")
+            return False, None
+
+    verbose_log(f"Fuzzy match {best.code} ({best.confidence:.2f})")
+    return True, best.code
 
 def handle_successful_match(filename, file_path, code, renamed_invoices_path, failed_path, email_file_map, method):
     new_filename = f"{code}_{filename}"
@@ -142,6 +108,8 @@ def handle_successful_match(filename, file_path, code, renamed_invoices_path, fa
         print(f"PDF match found")
     elif method == 'pytesseract':
         print(f"OCR match found")
+    elif method == 'fuzzy':
+        print(f"Fuzzy OCR match found")
 
 def handle_doubled_up(filename, file_path, failed_path, email_file_map):
     print(f"You've done {filename} already silly")
@@ -191,88 +159,190 @@ def handle_failed_file(filename, file_path, failed_path, email_file_map, text):
             print(f"Error handling failed file: {e}")
 
 def extract_text_ocr(file_path):
+    return ocr_engine.stream_ocr(file_path).text
+
+def extract_text_ocr_streaming(file_path, client_matcher, text_layer=None, file_hash=None):
+    # OCR page by page and stop at the first page that brings in a client name.
+    # Starts at a low DPI and only re-reads at a higher one if no client was found.
+    # Pages in text_layer ({page: text}) are used as they are and never OCR'd.
+    # A long document may be left part-read for the next sweep.
+    def match_client(text):
+        found_match, code = find_name_code_match(tokenize_document(text), client_matcher)
+        return code if found_match else None
+
+    result = ocr_engine.tiered_ocr(file_path, match_client, known_texts=text_layer, file_hash=file_hash)
+    verbose_log(result.stats.summary())
+    return result
+
+# PyPDF2 by default; BBKM_PDF_TEXT_BACKEND picks pdftotext or PyMuPDF instead
+page_texts_backend = get_backend()
+
+def extract_page_texts(file_path):
+    # One string per page ('' for pages without a text layer); None if the PDF can't be read
     try:
-        Image.MAX_IMAGE_PIXELS = None 
-        images = convert_from_path(file_path, dpi=300) 
-        text = ""
-        for img in images:
-            img = ImageEnhance.Contrast(img).enhance(1.5)
-            extracted_text = image_to_string(img)
-            text += extracted_text
-        return text
+        return page_texts_backend(file_path)
     except Exception as e:
-        print(f"Error extracting text with OCR: {e}")
-        return ""
-
-def extract_text_pypdf2(file_path):
-    with open(file_path, 'rb') as f:
-        reader = PdfReader(f)
-        text = ''
-        for page in reader.pages:
-            text += page.extract_text()
-    return text
-
-def process_pdf(filename, file_path, text, excel_data, renamed_invoices_path, failed_path, email_file_map, method):
-    found_match, code = find_name_code_match(text, excel_data)
+        print(f"Error extracting text with {PDF_TEXT_BACKEND}: {e}")
+        return None
+
+def process_pdf(filename, file_path, text, client_matcher, renamed_invoices_path, failed_path, email_file_map, method):
+    found_match, code = find_name_code_match(tokenize_document(text), client_matcher)
     if found_match:
         handle_successful_match(filename, file_path, code, renamed_invoices_path, failed_path, email_file_map, method)
-        return True
+    return found_match, code
+
+def process_pdf_fuzzy(filename, file_path, text, client_matcher, renamed_invoices_path, failed_path, email_file_map):
+    found_match, code = find_fuzzy_code_match(tokenize_document(text), client_matcher)
+    if found_match:
+        handle_successful_match(filename, file_path, code, renamed_invoices_path, failed_path, email_file_map, 'fuzzy')
+    return found_match, code
+
+def process_cached_pdf(filename, file_path, cached, renamed_invoices_path, failed_path, email_file_map):
+    if cached.code is not None:
+        print(f"Cached {cached.method} match for {filename}")
+        handle_successful_match(filename, file_path, cached.code, renamed_invoices_path, failed_path, email_file_map, cached.method)
     else:
-        return False
+        print(f"Cached no-match for {filename} (client list unchanged), skipping extraction")
+        handle_failed_file(filename, file_path, failed_path, email_file_map, "")
 
 def process_pdfs(pdf_files, invoices_path, excel_data, renamed_invoices_path, failed_path, email_file_map):
+    # Compile the client index once for the whole folder (or reuse the cached one)
+    if isinstance(excel_data, ClientMatcher):
+        client_matcher = excel_data
+    else:
+        client_matcher = build_client_matcher(excel_data)
+
+    # First, resolve the cheap file name matches for the whole folder before any PDF is opened
+    pending_files = []
     for filename in pdf_files:
-        file_path = os.path.join(invoices_path, filename)
-        
-        # First, try to find a match in the file name
-        found_match, code = find_name_code_match(filename, excel_data)
-        
+        found_match, code = find_name_code_match(tokenize_document(filename), client_matcher)
         if found_match:
+            file_path = os.path.join(invoices_path, filename)
             handle_successful_match(filename, file_path, code, renamed_invoices_path, failed_path, email_file_map, 'Filename')
-            continue
+        else:
+            pending_files.append(filename)
 
-        # If no match found in the file name, proceed with PyPDF2 extraction
+    ocr_ran = False
+    for filename in pending_files:
+        file_path = os.path.join(invoices_path, filename)
+
+        # Seen this exact PDF before? Reuse the result instead of re-running text extraction/OCR
         try:
-            text = extract_text_pypdf2(file_path)
-            found_match = process_pdf(filename, file_path, text, excel_data, renamed_invoices_path, failed_path, email_file_map, 'PyPDF2')
-        except Exception as e:
-            found_match = False
+            file_hash = file_sha256(file_path)
+        except OSError as e:
+            print(f"Error hashing {file_path}: {e}")
+            file_hash = None
+        cached = match_cache.lookup(file_hash, client_matcher) if file_hash else None
+        if cached is not None:
+            process_cached_pdf(filename, file_path, cached, renamed_invoices_path, failed_path, email_file_map)
+            continue
 
-        # If no match found using PyPDF2, proceed with OCR extraction
-        if not found_match:
-            text = extract_text_ocr(file_path)
-            found_match = process_pdf(filename, file_path, text, excel_data, renamed_invoices_path, failed_path, email_file_map, 'pytesseract')
+        # Structure-only triage: unreadable PDFs go straight to Failed, scans skip text extraction
+        kind = triage_pdf(file_path)
+        if kind in (CORRUPT, ENCRYPTED, EMPTY):
+            print(f"{filename} is {kind}, sending straight to Failed")
+            handle_failed_file(filename, file_path, failed_path, email_file_map, "")
+            # "corrupt" can also mean poppler wasn't reachable this time, so only the other two are remembered
+            if file_hash and kind != CORRUPT:
+                match_cache.record(file_hash, 'triage', None, client_matcher)
+            continue
+
+        # If no match found in the file name, use the PDF text layer on the pages that have a usable one
+        method = 'PyPDF2'
+        ocr_confidence = None
+        # A failed extraction or OCR run (or an unreadable scan) leaves the "no match" unproven; it isn't cached
+        extraction_failed = False
+        page_texts = extract_page_texts(file_path) if kind == TEXT_LAYER else []
+        if page_texts is None:
+            extraction_failed = True
+            page_texts = []
+        text_layer = {page: page_text for page, page_text in enumerate(page_texts, 1) if has_text_layer(page_text)}
+        text = tokenize_document(''.join(text_layer.values()))
+        found_match, code = False, None
+        if text_layer:
+            found_match, code = process_pdf(filename, file_path, text, client_matcher, renamed_invoices_path, failed_path, email_file_map, method)
+
+        # No match yet: OCR only the pages without a text layer, matching against all pages together
+        if not found_match and len(text_layer) < max(len(page_texts), 1):
+            method = 'pytesseract'
+            ocr_ran = True
+            ocr = extract_text_ocr_streaming(file_path, client_matcher, text_layer, file_hash)
+            if ocr.stats.pages_deferred:
+                # Long document: leave it in place, the next loop carries on from the OCR cache
+                print(f"Deferring {filename}: {ocr.stats.pages_deferred} pages still to OCR")
+                if filename in email_file_map:
+                    deferred_emails[filename] = email_file_map[filename]
+                continue
+            deferred_emails.pop(filename, None)
+            text = tokenize_document(ocr.text)
+            ocr_confidence = ocr.stats.confidence
+            extraction_failed = extraction_failed or ocr.stats.error is not None
+            found_match, code = process_pdf(filename, file_path, text, client_matcher, renamed_invoices_path, failed_path, email_file_map, method)
+
+        # A scan Tesseract could barely read even at the top tier goes straight to manual
+        # coding rather than a fuzzy guess; its "no match" proves nothing, so it isn't cached
+        if not found_match and ocr_engine.needs_review(ocr_confidence):
+            print(f"Low OCR confidence ({ocr_confidence:.0f}) for {filename}, sending for manual coding")
+            extraction_failed = True
+
+        # OCR often garbles a character or two of the name ("Srnith"); rename only confident fuzzy hits
+        elif not found_match and text.cleaned:
+            method = 'fuzzy'
+            found_match, code = process_pdf_fuzzy(filename, file_path, text, client_matcher, renamed_invoices_path, failed_path, email_file_map)
 
         if not found_match:
             handle_failed_file(filename, file_path, failed_path, email_file_map, text)
 
+        if file_hash and (found_match or not extraction_failed):
+            match_cache.record(file_hash, method, code if found_match else None, client_matcher)
+
+    if pending_files:
+        verbose_log(triage_summary())
+    if ocr_ran:
+        verbose_log(ocr_engine.tier_summary("client"))
+        verbose_log(ocr_engine.region_summary("client"))
+        verbose_log(ocr_engine.cache_summary())
+        verbose_log(profile_summary())
+
 def read_csv_data(csv_file):
     with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+        pass
+    # Always remove the temp copy: the cache retries every loop while Excel holds the file
+    try:
         shutil.copy2(csv_file, temp_file.name)
         try:
             csv_data = pd.read_csv(temp_file.name, encoding='utf-8', on_bad_lines='skip')
         except UnicodeDecodeError:
             csv_data = pd.read_csv(temp_file.name, encoding='ISO-8859-1', on_bad_lines='skip')
-    os.unlink(temp_file.name)
+    finally:
+        os.unlink(temp_file.name)
     return csv_data
 
+CLIENT_CSV_FILE = r"C:\Users\Administrator\Better Bookkeeping Management\BBKM - Documents\BBKM Plan Management\Client Names.csv"
+
+# Parsed client table and matcher, reloaded only when Client Names.csv changes on disk
+client_table = ClientTableCache(CLIENT_CSV_FILE, read_csv_data, build_client_matcher)
+
+# Match results by PDF content hash, shared across loops and restarts
+match_cache = MatchCache()
+
+# Source emails of files whose OCR was deferred; email_file_map is rebuilt every loop,
+# so these carry the link over to the sweep that finishes the file
+deferred_emails = {}
+
 def pytesseract_main(updated_saved_attachments, email_file_map):
     invoice_path = r"C:\BBKM_InvoiceSorter\Invoices"
-    csv_file = r"C:\Users\Administrator\Better Bookkeeping Management\BBKM - Documents\BBKM Plan Management\Client Names.csv"
     renamed_invoices_path = os.path.join(invoice_path, "Renamed Invoices")
     failed_path = os.path.join(invoice_path, "Failed")
 
     os.makedirs(renamed_invoices_path, exist_ok=True)
     os.makedirs(failed_path, exist_ok=True)
 
+    # A locked CSV keeps serving the last good copy; only the very first load can fail
     try:
-        csv_data = read_csv_data(csv_file)
-    except PermissionError:
-        print("Someone opened the CSV file. Waiting for 3 minutes before retrying...")
-        time.sleep(180)
-        print("Restarting the script...")
-        script_path = f'"{sys.argv[0]}"'
-        os.execl(sys.executable, sys.executable, script_path, *sys.argv[1:])
+        clients = client_table.get()
+    except (OSError, ValueError) as e:
+        print(f"Could not load the client list yet ({e}). Will retry on the next run.")
         return
 
     email_file_map_copy = email_file_map.copy()
@@ -280,7 +350,13 @@ def pytesseract_main(updated_saved_attachments, email_file_map):
         email_file_map[os.path.basename(file_path)] = email
 
     pdf_files = [f for f in os.listdir(invoice_path) if f.lower().endswith('.pdf')]
-    process_pdfs(pdf_files, invoice_path, csv_data, renamed_invoices_path, failed_path, email_file_map)
+    for filename in list(deferred_emails):
+        if filename in pdf_files:
+            email_file_map.setdefault(filename, deferred_emails[filename])
+        else:
+            # Moved or deleted by hand since it was deferred
+            del deferred_emails[filename]
+    process_pdfs(pdf_files, invoice_path, clients.matcher, renamed_invoices_path, failed_path, email_file_map)
 
 
 def main():
@@ -0,0 +1,107 @@
+import os
+import re
+
+# Tokenizer used for client-name matching:
+#   "regex" - zero-dependency tokenizer (default)
+#   "spacy" - spaCy's tokenizer, loaded on first use with every pipeline component excluded
+TOKENIZER_BACKEND = os.getenv("BBKM_TOKENIZER_BACKEND", "regex").strip().lower()
+
+SPACY_MODEL = "en_core_web_sm"
+SPACY_EXCLUDE = ["tok2vec", "tagger", "parser", "senter", "attribute_ruler", "lemmatizer", "ner"]
+
+_WORD_OR_SPACE = re.compile(r'\w+|\s+')
+_spacy_nlp = None
+
+
+def clean_text(text):
+    """Strip punctuation and the NDIS marker exactly like the original matcher."""
+    return re.sub(r'[^\w\s]', '', text).strip().replace(':', '').replace('NDIS', '')
+
+
+def lower_same_length(text):
+    # Offsets found in the lowered text must line up with the cleaned text,
+    # so fall back to per-character lowering when str.lower() changes length.
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+def regex_tokens(text):
+    """
+    Tokenise cleaned text (word characters and whitespace only) the way spaCy
+    does: one token per word, leading and trailing underscores split off as
+    "_" tokens, a single space after a token is absorbed and any other
+    whitespace run becomes its own token. spaCy's English exceptions
+    ("cannot", "10km") are not split; they never occur inside client names.
+    """
+    tokens = []
+    for m in _WORD_OR_SPACE.finditer(text):
+        token, start = m.group(), m.start()
+        if token[0].isspace():
+            if start > 0 and token[0] == ' ':
+                token, start = token[1:], start + 1
+            if token:
+                tokens.append((token, start))
+            continue
+        # spaCy splits leading and trailing underscores off one by one ("john_" -> "john", "_")
+        # but keeps inner ones ("john_smith")
+        core = token.strip('_')
+        lead = len(token) - len(token.lstrip('_'))
+        if not core:
+            lead = len(token)
+        tokens.extend(('_', start + i) for i in range(lead))
+        if core:
+            tokens.append((core, start + lead))
+        tokens.extend(('_', start + i) for i in range(lead + len(core), len(token)))
+    return tokens
+
+
+def spacy_tokens(text):
+    global _spacy_nlp
+    if _spacy_nlp is None:
+        import spacy
+        _spacy_nlp = spacy.load(SPACY_MODEL, exclude=SPACY_EXCLUDE)
+    # make_doc runs the tokenizer only, never the pipeline
+    return [(token.text, token.idx) for token in _spacy_nlp.make_doc(text)]
+
+
+TOKENIZERS = {
+    "regex": regex_tokens,
+    "spacy": spacy_tokens,
+}
+
+
+def get_tokenizer(backend=None):
+    backend = backend or TOKENIZER_BACKEND
+    try:
+        return TOKENIZERS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown tokenizer backend '{backend}'. Expected one of: {', '.join(TOKENIZERS)}")
+
+
+class TokenizedText:
+    """
+    One extraction result (a filename, PyPDF2 text or OCR text) cleaned and
+    tokenised once, so every client name check can share it.
+
+    `tokenizer` takes the cleaned text and returns (token, start offset) pairs;
+    it defaults to the configured backend.
+    """
+
+    __slots__ = ("raw", "cleaned", "lowered", "tokens", "positions")
+
+    def __init__(self, raw, tokenizer=None):
+        tokenizer = tokenizer or get_tokenizer()
+        self.raw = raw
+        self.cleaned = clean_text(raw)
+        self.lowered = lower_same_length(self.cleaned)
+        pairs = tokenizer(self.cleaned)
+        self.tokens = [token.lower() for token, _ in pairs]
+        self.positions = [start for _, start in pairs]
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __repr__(self):
+        return f"TokenizedText({len(self.cleaned)} chars, {len(self.tokens)} tokens)"
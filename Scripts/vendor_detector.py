@@ -0,0 +1,49 @@
+from collections import namedtuple
+
+from aho_corasick import AhoCorasick
+
+# One vendor name found in squashed text; start/end index that text
+VendorHit = namedtuple("VendorHit", ["vendor", "start", "end"])
+
+
+def squash(text: str) -> str:
+    """Lower-case with spaces removed, the form vendor names are matched in."""
+    return text.lower().replace(" ", "")
+
+
+class VendorDetector:
+    """
+    Every vendor from Vendors.csv compiled once into one Aho-Corasick
+    automaton, so a page (or filename) is scanned in a single pass however
+    many vendors there are.
+
+    When several vendors occur, `best` picks the longest name, then the
+    earliest position, then the earlier CSV row; "Sunrise Support Services"
+    beats "Sunrise" wherever the two appear.
+    """
+
+    def __init__(self, vendors):
+        self.automaton = AhoCorasick()
+        self._rank = {}
+        for vendor in vendors:
+            if vendor in self._rank:
+                continue
+            self._rank[vendor] = len(self._rank)
+            self.automaton.add(squash(str(vendor)), vendor)
+        self.automaton.build()
+
+    def __len__(self):
+        return len(self._rank)
+
+    def find_all(self, squashed: str):
+        """Every vendor occurrence in already-squashed text, by position."""
+        hits = [VendorHit(vendor, start, end) for start, end, vendor in self.automaton.iter_matches(squashed)]
+        hits.sort(key=lambda hit: (hit.start, -(hit.end - hit.start), self._rank[hit.vendor]))
+        return hits
+
+    def best(self, squashed: str):
+        """The vendor to route by, or None."""
+        hits = self.find_all(squashed)
+        if not hits:
+            return None
+        return min(hits, key=lambda hit: (-(hit.end - hit.start), hit.start, self._rank[hit.vendor])).vendor